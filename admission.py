@@ -0,0 +1,149 @@
+import hmac
+import time
+import asyncio
+import hashlib
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a task that sleeps every interval seconds.
+
+    Every sample is observed on histogram, if given; lag holds an
+    exponentially smoothed value so one slow callback does not look like
+    sustained overload.
+    """
+
+    def __init__(self, interval=0.05, histogram=None, smoothing=0.2):
+        self.interval = interval
+        self.histogram = histogram
+        self.smoothing = smoothing
+        self.lag = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.task = None
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.lag += self.smoothing * (lag - self.lag)
+            if self.histogram:
+                self.histogram.observe(lag)
+
+class AdmissionController:
+    """Decide whether this worker can take another call.
+
+    A call is shed when live calls (active_calls() plus inbound calls
+    answered but not yet streaming) have reached max_calls, or when the
+    smoothed event-loop lag is above max_lag seconds, since by then every
+    caller's audio is already suffering. /incoming-call admits a call by
+    reserving a slot for its CallSid for up to reservation_ttl seconds; its
+    media stream then claims that slot. Reservations are per process, so with
+    several workers the stream may land on a worker that never saw the
+    webhook: it then presents token(call_sid), an HMAC of the CallSid under
+    secret, and is taken even over the call limit while the other worker's
+    reservation lapses after reservation_ttl. Admitted streams are still shed
+    on loop lag. Other streams, such as outbound calls, are checked in full
+    when they start. A limit of 0 disables it.
+    """
+
+    REASONS = ('call_limit', 'loop_lag')
+
+    def __init__(self, active_calls, max_calls=0, lag_monitor=None, max_lag=0.0, reservation_ttl=30, secret=None):
+        self.active_calls = active_calls
+        self.max_calls = max_calls
+        self.lag_monitor = lag_monitor
+        self.max_lag = max_lag
+        self.reservation_ttl = reservation_ttl
+        self.secret = secret.encode() if secret else None
+        self.reservations = {}  # call_sid -> monotonic time it was admitted
+        self.admitted = 0
+        self.admitted_elsewhere = 0
+        self.bad_tokens = 0
+        self.shed = {(where, reason): 0 for where in ('incoming', 'stream') for reason in self.REASONS}
+
+    def reserved(self):
+        now = time.monotonic()
+        for call_sid, admitted_at in list(self.reservations.items()):
+            if now - admitted_at > self.reservation_ttl:
+                del self.reservations[call_sid]
+        return len(self.reservations)
+
+    def overloaded(self, live=0):
+        """Return why one more call would be refused given live calls, or None."""
+        if self.max_calls and live >= self.max_calls:
+            return 'call_limit'
+        if self.max_lag and self.lag_monitor and self.lag_monitor.lag > self.max_lag:
+            return 'loop_lag'
+        return None
+
+    def admit_incoming(self, call_sid):
+        """Reserve a slot for an inbound call, or return the reason it is shed."""
+        reason = self.overloaded(self.active_calls() + self.reserved())
+        if reason:
+            self.shed[('incoming', reason)] += 1
+            return reason
+        if call_sid:
+            self.reservations[call_sid] = time.monotonic()
+        self.admitted += 1
+        return None
+
+    def token(self, call_sid):
+        """Return the token that marks call_sid as admitted, or None without a secret."""
+        if not (self.secret and call_sid):
+            return None
+        return hmac.new(self.secret, call_sid.encode(), hashlib.sha256).hexdigest()
+
+    def admit_stream(self, call_sid, token=None):
+        """Admit a started media stream that is already counted in active_calls(), or return the reason it is shed.
+
+        A stream that claims a reservation, or presents a valid token(call_sid)
+        from /incoming-call on another worker, skips the call limit but not
+        the loop-lag check. An invalid token is counted and ignored.
+        """
+        reserved = self.reservations.pop(call_sid, None) is not None
+        admitted = reserved
+        if not reserved and token:
+            expected = self.token(call_sid)
+            admitted = expected is not None and hmac.compare_digest(expected, token)
+            if not admitted:
+                self.bad_tokens += 1
+        live = 0 if admitted else self.active_calls() - 1 + self.reserved()
+        reason = self.overloaded(live)
+        if reason:
+            self.shed[('stream', reason)] += 1
+            return reason
+        if not reserved:
+            if admitted:
+                self.admitted_elsewhere += 1
+            else:
+                self.admitted += 1
+        return None
+
+    def stats(self):
+        return {
+            "max_calls": self.max_calls,
+            "active_calls": self.active_calls(),
+            "reserved": self.reserved(),
+            "loop_lag_seconds": self.lag_monitor.lag if self.lag_monitor else None,
+            "loop_lag_limit_seconds": self.max_lag,
+            "admitted": self.admitted,
+            "admitted_elsewhere": self.admitted_elsewhere,
+            "bad_tokens": self.bad_tokens,
+            "shed": {f"{where}_{reason}": count for (where, reason), count in self.shed.items()},
+        }
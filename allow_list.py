@@ -0,0 +1,133 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AllowListUnavailable(Exception):
+    """A number could not be checked because the per-number lookup failed."""
+
+class AllowList:
+    """In-process cache of the numbers outbound calls may be placed to.
+
+    load is a coroutine function returning every allowed number (the
+    account's incoming numbers and verified caller IDs). It runs once at
+    start() and again every ttl seconds in the background, so allowed() is a
+    set lookup. A number missing from the set is checked with lookup, a
+    coroutine function returning True or False for one number; a positive
+    answer is added to the set and a negative one is remembered for
+    negative_ttl seconds so a number verified a minute ago is not refused
+    until the next refresh. A failing lookup raises AllowListUnavailable
+    and caches nothing.
+    """
+
+    def __init__(self, load, lookup, ttl=300, negative_ttl=60):
+        self.load = load
+        self.lookup = lookup
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.numbers = frozenset()
+        self.denied = {}  # number -> monotonic time the negative answer expires
+        self.loaded_at = None
+        self.task = None
+        self.refresh_now = asyncio.Event()
+        self.invalidated = set()  # Numbers forgotten since the current load started
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    async def start(self):
+        """Load the allow-list in the background and keep it refreshed.
+
+        Until the first load completes every check falls through to lookup.
+        """
+        if self.task is None:
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def refresh(self):
+        """Replace the cached numbers with a fresh bulk load; keep the old set if it fails.
+
+        Numbers invalidated while the load runs stay out of the new set, since
+        the load may have read them before they changed.
+        """
+        self.invalidated = set()
+        try:
+            numbers = frozenset(await self.load()) - self.invalidated
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning("Failed to load outbound allow-list: %r", e)
+            return
+        self.numbers = numbers
+        self.denied.clear()
+        self.loaded_at = time.monotonic()
+        self.refreshes += 1
+        logger.info("Loaded %d allowed outbound numbers", len(numbers))
+
+    async def allowed(self, number):
+        """Return whether number may be called, asking Twilio only on a cache miss."""
+        if number in self.numbers:
+            self.hits += 1
+            return True
+        expires = self.denied.get(number)
+        if expires is not None:
+            if time.monotonic() < expires:
+                self.negative_hits += 1
+                return False
+            del self.denied[number]
+
+        self.misses += 1
+        try:
+            allowed = await self.lookup(number)
+        except Exception as e:
+            raise AllowListUnavailable(f"Could not check {number}: {e!r}") from e
+        if allowed:
+            self.numbers = self.numbers | {number}
+            return True
+        self.denied[number] = time.monotonic() + self.negative_ttl
+        return False
+
+    def invalidate(self, number=None):
+        """Forget the cached answer for number, or for every number and reload in the background."""
+        if number is not None:
+            self.denied.pop(number, None)
+            self.numbers = self.numbers - {number}
+            self.invalidated.add(number)
+            return
+        self.denied.clear()
+        self.refresh_now.set()
+
+    def stats(self):
+        """Return allow-list counters for the metrics surface."""
+        return {
+            "numbers": len(self.numbers),
+            "denied": len(self.denied),
+            "age_seconds": None if self.loaded_at is None else time.monotonic() - self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+    async def _refresh_loop(self):
+        while True:
+            self.refresh_now.clear()
+            await self.refresh()
+            if self.refresh_now.is_set():
+                # invalidate() arrived during the load, which may predate it
+                continue
+            try:
+                await asyncio.wait_for(self.refresh_now.wait(), timeout=self.ttl)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,98 @@
+import sys
+import queue
+import atexit
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s stream=%(stream_sid)s call=%(call_sid)s %(message)s"
+
+# Identifiers of the call being handled by the current task
+call_context = contextvars.ContextVar('call_context', default={})
+
+def bind_call(stream_sid=None, call_sid=None):
+    """Attach call identifiers to every record logged from the current task and its children."""
+    call_context.set({"stream_sid": stream_sid, "call_sid": call_sid})
+
+class CallContextFilter(logging.Filter):
+    """Stamp records with the current call's stream_sid and call_sid."""
+
+    def filter(self, record):
+        context = call_context.get()
+        record.stream_sid = context.get("stream_sid") or "-"
+        record.call_sid = context.get("call_sid") or "-"
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Let through one in N records logged with extra={'sample_every': N}.
+
+    High-frequency events such as audio deltas are sampled per message
+    template so they stay visible without flooding the queue.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.seen = {}
+
+    def filter(self, record):
+        every = getattr(record, 'sample_every', None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.msg)
+        count = self.seen.get(key, 0)
+        self.seen[key] = count + 1
+        return count % every == 0
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops and counts records instead of blocking when the queue is full.
+
+    Records are queued unformatted, so message arguments are rendered on the
+    listener thread: log values, not objects the caller goes on to mutate.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The base class formats the message and traceback here, on the thread that logged it
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+handler = None
+listener = None
+
+def setup_logging(level='INFO', queue_size=10000, stream=None):
+    """Route all logging through a bounded queue drained by a background thread.
+
+    Callers on the event loop only pay for a non-blocking put; formatting and
+    the write to stream (stderr by default) happen on the listener thread.
+    Safe to call more than once; later calls only change the level.
+    """
+    global handler, listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    if handler is not None:
+        return handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(CallContextFilter())
+    root.addHandler(handler)
+
+    listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+def dropped_records():
+    """Number of log records discarded because the queue was full."""
+    return handler.dropped if handler else 0
@@ -0,0 +1,192 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it nothing in this module beyond the pure-Python codec works
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# G.711 μ-law works on 14-bit magnitudes, biased by 0x21 and clipped so the bias can't overflow
+ULAW_BIAS = 0x21
+ULAW_CLIP = 8159
+# Twilio's μ-law rate and the rate of OpenAI's pcm16 format
+TWILIO_RATE = 8000
+PCM16_RATE = 24000
+
+def ulaw_decode_sample(code):
+    """G.711 μ-law code -> 16-bit linear sample."""
+    code = ~code & 0xFF
+    magnitude = ((((code & 0x0F) << 3) + 0x84) << ((code >> 4) & 0x07)) - 0x84
+    return -magnitude if code & 0x80 else magnitude
+
+def ulaw_encode_sample(sample):
+    """16-bit linear sample -> G.711 μ-law code, rounding exactly like audioop.lin2ulaw."""
+    value = sample >> 2
+    mask = 0x7F if value < 0 else 0xFF
+    value = min(abs(value), ULAW_CLIP) + ULAW_BIAS
+    segment = value.bit_length() - 6
+    if segment > 7:
+        return 0x7F ^ mask
+    return ((segment << 4) | ((value >> (segment + 1)) & 0x0F)) ^ mask
+
+def ulaw_decode_table():
+    """G.711 μ-law code -> 16-bit linear sample, for all 256 codes."""
+    return [ulaw_decode_sample(code) for code in range(256)]
+
+def ulaw_encode_table():
+    """μ-law code for every int16 sample, indexed by the sample's bits read as uint16."""
+    value = np.arange(1 << 16, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(value), ULAW_CLIP) + ULAW_BIAS
+    segment = np.frexp(value)[1] - 6  # frexp's exponent is the bit length
+    codes = (segment << 4) | ((value >> (segment + 1)) & 0x0F)
+    codes[segment > 7] = 0x7F
+    return (codes ^ mask).astype(np.uint8)
+
+if NUMPY_AVAILABLE:
+    ULAW_TO_PCM16 = np.array(ulaw_decode_table(), dtype=np.int16)
+    PCM16_TO_ULAW = ulaw_encode_table()
+else:
+    ULAW_TO_PCM16 = PCM16_TO_ULAW = None
+
+def ulaw_decode(ulaw):
+    """Decode μ-law bytes (or any buffer) to an int16 array with one table lookup."""
+    return ULAW_TO_PCM16[np.frombuffer(ulaw, dtype=np.uint8)]
+
+def ulaw_encode(pcm):
+    """Encode an int16 array to μ-law bytes with one table lookup."""
+    return PCM16_TO_ULAW[np.asarray(pcm, dtype=np.int16).view(np.uint16)].tobytes()
+
+def pcm16_samples(pcm):
+    """View little-endian PCM16 bytes, as OpenAI sends them, as an int16 array."""
+    return np.frombuffer(pcm, dtype='<i2')
+
+def to_int16(samples):
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+
+def lowpass_taps(count, cutoff):
+    """Hamming-windowed sinc low-pass filter with unity DC gain; cutoff in cycles per sample."""
+    n = np.arange(count) - (count - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(count)
+    return taps / taps.sum()
+
+class Resampler:
+    """Streaming 8 kHz <-> 24 kHz PCM16 resampler.
+
+    A polyphase windowed-sinc FIR whose history carries across calls, so
+    audio can be fed in chunks of any length without clicks at the seams.
+    The filter cuts off just below 4 kHz, the Nyquist rate of the 8 kHz
+    side, and delays the signal by half its length.
+    """
+
+    def __init__(self, from_rate, to_rate, taps=48):
+        if to_rate == from_rate * 3:
+            self.up, self.down = 3, 1
+        elif from_rate == to_rate * 3:
+            self.up, self.down = 1, 3
+        else:
+            raise ValueError(f"Can't resample {from_rate} Hz to {to_rate} Hz")
+        taps -= taps % 3
+        self.filter = lowpass_taps(taps, 0.45 / 3)
+        if self.up > 1:
+            # One sub-filter per output phase, each scaled back to unity gain
+            self.phases = [self.filter[phase::3] * 3 for phase in range(3)]
+            self.history = np.zeros(taps // 3 - 1)
+        else:
+            self.history = np.zeros(taps - 1)
+        self.offset = 0  # Index in the next chunk of the next input sample that lines up with an output sample
+
+    def process(self, pcm):
+        """Resample an int16 array and return the int16 output available so far."""
+        buffer = np.concatenate((self.history, pcm))
+        self.history = buffer[len(buffer) - len(self.history):]
+        if self.up > 1:
+            out = np.empty(len(pcm) * 3)
+            for phase, taps in enumerate(self.phases):
+                out[phase::3] = np.convolve(buffer, taps, 'valid')
+        else:
+            out = np.convolve(buffer, self.filter, 'valid')[self.offset::3]
+            self.offset = (self.offset - len(pcm)) % 3
+        return to_int16(out)
+
+def ulaw_to_pcm16(ulaw, upsampler):
+    """Twilio μ-law bytes -> 24 kHz little-endian PCM16 bytes for OpenAI."""
+    return upsampler.process(ulaw_decode(ulaw)).astype('<i2').tobytes()
+
+def pcm16_to_ulaw(pcm, downsampler):
+    """OpenAI 24 kHz PCM16 bytes -> 8 kHz μ-law bytes for Twilio."""
+    return ulaw_encode(downsampler.process(pcm16_samples(pcm)))
+
+def level_db(samples):
+    """RMS level of int16 samples in dBFS, floored at one LSB."""
+    if len(samples) == 0:
+        return 20 * math.log10(1 / 32768)
+    samples = samples.astype(np.float32)
+    rms = float(np.sqrt(np.mean(samples * samples)))
+    return 20 * math.log10(max(rms, 1.0) / 32768)
+
+def zero_crossing_rate(samples):
+    """Fraction of adjacent sample pairs that change sign."""
+    signs = np.signbit(samples)
+    return np.count_nonzero(signs[1:] != signs[:-1]) / max(1, len(samples) - 1)
+
+def frame_levels_db(ulaw, frame_bytes=160):
+    """RMS level in dBFS of each frame_bytes frame of a μ-law batch; a trailing partial frame counts as a frame."""
+    samples = ulaw_decode(ulaw).astype(np.float32)
+    if samples.size == 0:
+        return np.empty(0)
+    starts = np.arange(0, samples.size, frame_bytes)
+    energy = np.add.reduceat(samples * samples, starts)
+    counts = np.diff(np.append(starts, samples.size))
+    rms = np.sqrt(energy / counts)
+    return 20 * np.log10(np.maximum(rms, 1.0) / 32768)
+
+def normalize_gain(pcm, target_db=-20.0, max_gain_db=20.0):
+    """Scale int16 samples so their RMS level is target_db dBFS, boosting by at most max_gain_db."""
+    gain_db = min(target_db - level_db(pcm), max_gain_db)
+    return to_int16(pcm.astype(np.float32) * 10 ** (gain_db / 20))
+
+class LevelStats:
+    """Level and silence statistics of a call's μ-law audio, measured a batch of frames at a time.
+
+    frame() only appends to a buffer; every batch_frames frames the batch is
+    measured with one frame_levels_db call. Frames below threshold_db count
+    as silence; the speech level is the mean power of the others.
+    """
+
+    def __init__(self, threshold_db=-50.0, batch_frames=50, frame_bytes=160):
+        self.threshold_db = threshold_db
+        self.frame_bytes = frame_bytes
+        self.batch_bytes = batch_frames * frame_bytes
+        self.buffer = bytearray()
+        self.frames = 0
+        self.silent_frames = 0
+        self.speech_power = 0.0  # Sum of the linear power of non-silent frames
+        self.peak_db = None
+
+    def frame(self, ulaw):
+        self.buffer += ulaw
+        if len(self.buffer) >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        levels = frame_levels_db(bytes(self.buffer), self.frame_bytes)
+        self.buffer.clear()
+        speech = levels[levels >= self.threshold_db]
+        self.frames += levels.size
+        self.silent_frames += levels.size - speech.size
+        self.speech_power += float(np.sum(10 ** (speech / 10)))
+        peak = float(levels.max())
+        self.peak_db = peak if self.peak_db is None else max(self.peak_db, peak)
+
+    @property
+    def silence_ratio(self):
+        return self.silent_frames / self.frames if self.frames else None
+
+    @property
+    def speech_level_db(self):
+        speech_frames = self.frames - self.silent_frames
+        return 10 * math.log10(self.speech_power / speech_frames) if speech_frames else None
@@ -0,0 +1,53 @@
+import json
+import base64
+import os
+import time
+import argparse
+from twilio_media import media_frame_template, media_frame
+
+STREAM_SID = "MZ00000000000000000000000000000000"
+
+def legacy_frame(delta):
+    """Previous send_to_twilio path: decode, re-encode, build a dict, serialize it like send_json."""
+    audio_payload = base64.b64encode(base64.b64decode(delta)).decode('utf-8')
+    audio_delta = {
+        "event": "media",
+        "streamSid": STREAM_SID,
+        "media": {
+            "payload": audio_payload
+        }
+    }
+    return json.dumps(audio_delta, separators=(",", ":"), ensure_ascii=False)
+
+def passthrough_frame(prefix, delta):
+    """Passthrough path: forward the delta string inside the prebuilt frame template."""
+    return media_frame(prefix, delta)
+
+def frames_per_second(build, deltas, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for delta in deltas:
+            build(delta)
+    elapsed = time.perf_counter() - start
+    return rounds * len(deltas) / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare outbound Twilio media frame construction paths.")
+    parser.add_argument('--chunk-bytes', type=int, default=800, help="Size of each decoded μ-law delta (800 bytes = 100 ms)")
+    parser.add_argument('--chunks', type=int, default=256, help="Number of distinct deltas per round")
+    parser.add_argument('--rounds', type=int, default=200, help="Number of rounds over the deltas")
+    args = parser.parse_args()
+
+    deltas = [base64.b64encode(os.urandom(args.chunk_bytes)).decode('utf-8') for _ in range(args.chunks)]
+    prefix = media_frame_template(STREAM_SID)
+
+    # Both paths must produce equivalent frames
+    assert all(json.loads(legacy_frame(d)) == json.loads(passthrough_frame(prefix, d)) for d in deltas)
+
+    legacy = frames_per_second(legacy_frame, deltas, args.rounds)
+    passthrough = frames_per_second(lambda d: passthrough_frame(prefix, d), deltas, args.rounds)
+
+    print(f"Chunk size: {args.chunk_bytes} bytes, {args.chunks * args.rounds} frames per path")
+    print(f"Legacy (decode + re-encode + send_json): {legacy:,.0f} frames/sec")
+    print(f"Passthrough (prebuilt template):         {passthrough:,.0f} frames/sec")
+    print(f"Speedup: {passthrough / legacy:.1f}x")
@@ -0,0 +1,96 @@
+import math
+import time
+import argparse
+import warnings
+import numpy as np
+from audio_dsp import (
+    ulaw_decode_sample, ulaw_encode_sample, ulaw_decode, ulaw_encode, Resampler, frame_levels_db, TWILIO_RATE,
+)
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    try:
+        import audioop  # Removed in Python 3.13
+    except ImportError:
+        audioop = None
+
+FRAME_BYTES = 160  # One 20 ms Twilio frame
+
+def loop_decode(ulaw):
+    """Per-sample decode, the way a pure-Python audioop.ulaw2lin would do it."""
+    return [ulaw_decode_sample(code) for code in ulaw]
+
+def loop_encode(samples):
+    return bytes(ulaw_encode_sample(sample) for sample in samples)
+
+def loop_upsample(samples):
+    """Per-sample linear interpolation to three times the rate."""
+    out = []
+    previous = samples[0]
+    for sample in samples:
+        out.append(previous)
+        out.append(previous + (sample - previous) // 3)
+        out.append(previous + 2 * (sample - previous) // 3)
+        previous = sample
+    return out
+
+def loop_levels(ulaw):
+    levels = []
+    for start in range(0, len(ulaw), FRAME_BYTES):
+        samples = loop_decode(ulaw[start:start + FRAME_BYTES])
+        rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+        levels.append(20 * math.log10(max(rms, 1.0) / 32768))
+    return levels
+
+def audioop_levels(ulaw):
+    pcm = audioop.ulaw2lin(ulaw, 2)
+    return [
+        20 * math.log10(max(audioop.rms(pcm[start:start + 2 * FRAME_BYTES], 2), 1) / 32768)
+        for start in range(0, len(pcm), 2 * FRAME_BYTES)
+    ]
+
+def realtime_factor(function, argument, audio_seconds, rounds):
+    """Seconds of audio processed per second of CPU."""
+    start = time.process_time()
+    for _ in range(rounds):
+        function(argument)
+    return rounds * audio_seconds / (time.process_time() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-sample loops, audioop and the vectorized audio_dsp paths.")
+    parser.add_argument('--seconds', type=float, default=10, help="Seconds of 8 kHz audio per round")
+    parser.add_argument('--rounds', type=int, default=5, help="Rounds per vectorized path (loops run once)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pcm = (rng.normal(0, 3000, int(args.seconds * TWILIO_RATE))).clip(-32768, 32767).astype(np.int16)
+    ulaw = ulaw_encode(pcm)
+    samples = pcm.tolist()
+
+    # Every path must agree with the reference codec
+    assert loop_decode(ulaw) == ulaw_decode(ulaw).tolist()
+    assert loop_encode(samples) == ulaw
+    if audioop:
+        assert audioop.ulaw2lin(ulaw, 2) == ulaw_decode(ulaw).tobytes()
+        assert audioop.lin2ulaw(pcm.tobytes(), 2) == ulaw
+
+    upsampler = Resampler(8000, 24000)
+    cases = [
+        ("decode μ-law -> PCM16", loop_decode, ulaw,
+         audioop and (lambda data: audioop.ulaw2lin(data, 2)), ulaw, ulaw_decode, ulaw),
+        ("encode PCM16 -> μ-law", loop_encode, samples,
+         audioop and (lambda data: audioop.lin2ulaw(data, 2)), pcm.tobytes(), ulaw_encode, pcm),
+        ("resample 8 -> 24 kHz", loop_upsample, samples,
+         audioop and (lambda data: audioop.ratecv(data, 2, 1, 8000, 24000, None)), pcm.tobytes(), upsampler.process, pcm),
+        ("20 ms frame levels", loop_levels, ulaw,
+         audioop and audioop_levels, ulaw, frame_levels_db, ulaw),
+    ]
+
+    print(f"{args.seconds:g} s of audio; figures are seconds of audio per CPU second")
+    print(f"{'operation':<24} {'Python loop':>12} {'audioop':>12} {'numpy':>12} {'numpy/loop':>11}")
+    for name, loop, loop_input, reference, reference_input, vectorized, vectorized_input in cases:
+        looped = realtime_factor(loop, loop_input, args.seconds, 1)
+        native = realtime_factor(reference, reference_input, args.seconds, args.rounds) if reference else None
+        numpy_path = realtime_factor(vectorized, vectorized_input, args.seconds, args.rounds)
+        native_text = f"{native:>12,.0f}" if native else f"{'n/a':>12}"
+        print(f"{name:<24} {looped:>12,.0f} {native_text} {numpy_path:>12,.0f} {numpy_path / looped:>10.0f}x")
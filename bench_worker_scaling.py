@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from load_test import run_load, spawn, wait_for_port, percentile, resource_usage
+
+def step_ok(summary, args):
+    """Whether a load step met the latency targets with no failed calls."""
+    v2v_p95 = percentile(summary["voice_to_voice"], 0.95)
+    jitter_p99 = percentile(summary["jitter"], 0.99)
+    return (
+        summary["failed"] == 0
+        and v2v_p95 is not None and v2v_p95 * 1000 <= args.max_v2v_ms
+        and (jitter_p99 or 0) * 1000 <= args.max_jitter_ms
+    )
+
+async def capacity(args, workers):
+    """Raise concurrent calls against serve.py --workers N until a step misses its targets.
+
+    Returns (last passing step summary or None, mock CPU share of one core at
+    the highest step, load generator CPU share at the highest step).
+    """
+    spawn_args = argparse.Namespace(**{**vars(args), "workers": workers})
+    mock, bridge = spawn(spawn_args)
+    best = None
+    mock_share = driver_share = 0.0
+    try:
+        await wait_for_port(args.host, args.port)
+        calls = args.start_calls * workers
+        while calls <= args.max_calls:
+            step_args = argparse.Namespace(**{**vars(args), "calls": calls})
+            mock_before = resource_usage(mock.pid)
+            driver_before = time.process_time()
+            summary = await run_load(step_args, bridge.pid, quiet=True)
+            mock_after = resource_usage(mock.pid)
+            if mock_before and mock_after:
+                mock_share = (mock_after[0] - mock_before[0]) / summary["wall"]
+            driver_share = (time.process_time() - driver_before) / summary["wall"]
+            ok = step_ok(summary, args)
+            v2v_p95 = percentile(summary["voice_to_voice"], 0.95)
+            jitter_p99 = percentile(summary["jitter"], 0.99)
+            print(f"  workers {workers}: {calls:>5} calls  failed {summary['failed']:>3}  "
+                  f"v2v p95 {v2v_p95 * 1000 if v2v_p95 is not None else float('nan'):>7.1f} ms  "
+                  f"jitter p99 {jitter_p99 * 1000 if jitter_p99 is not None else float('nan'):>6.1f} ms  "
+                  f"{'ok' if ok else 'over target'}", flush=True)
+            if not ok:
+                break
+            best = summary
+            calls = max(calls + 1, int(calls * args.growth))
+            # Let the previous step's sessions close before the next ramp
+            await asyncio.sleep(2)
+    finally:
+        mock.terminate()
+        bridge.terminate()
+        mock.wait()
+        bridge.wait()
+        # Give the ports time to be released before the next worker count
+        await asyncio.sleep(1)
+    return best, mock_share, driver_share
+
+def row(name, values):
+    cells = [percentile(values, p) for p in (0.5, 0.95, 0.99)]
+    return f"{name} " + " ".join(f"{v * 1000:>7.1f}" if v is not None else f"{'-':>7}" for v in cells)
+
+async def main(args):
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    results = []
+    for workers in worker_counts:
+        print(f"serve.py --workers {workers}", flush=True)
+        results.append((workers, *await capacity(args, workers)))
+
+    print(f"\n{cpus} CPUs; targets: no failed calls, voice-to-voice p95 <= {args.max_v2v_ms} ms, "
+          f"outbound jitter p99 <= {args.max_jitter_ms} ms, {args.duration:.0f} s calls")
+    print(f"{'workers':>7} {'calls':>6} {'/worker':>8} {'/core':>6} {'scaling':>8}   "
+          f"{'v2v p50':>7} {'p95':>7} {'p99':>7}   {'jit p50':>7} {'p95':>7} {'p99':>7}   {'CPU ms/call-s':>13}")
+    baseline = None
+    for workers, best, mock_share, driver_share in results:
+        if best is None:
+            print(f"{workers:>7} {'-':>6}  (missed the targets at {args.start_calls * workers} calls)")
+            continue
+        calls = best["calls"]
+        cores = min(workers, cpus)
+        baseline = baseline or calls / workers
+        cpu = best["server_cpu"]
+        cpu_text = f"{cpu / (calls * args.duration) * 1000:>13.2f}" if cpu is not None else f"{'-':>13}"
+        print(f"{workers:>7} {calls:>6} {calls / workers:>8.1f} {calls / cores:>6.1f} {calls / baseline:>7.2f}x   "
+              f"{row('', best['voice_to_voice']).strip():>23}   {row('', best['jitter']).strip():>23}   {cpu_text}")
+        if mock_share > 0.9 or driver_share > 0.9:
+            print(f"{'':>7} warning: mock at {mock_share:.0%} and load generator at {driver_share:.0%} of a core; "
+                  "they, not the bridge, may be the limit")
+    if any(best and best["calls"] * args.growth > args.max_calls for _, best, _, _ in results):
+        print("Some worker counts met the targets at --max-calls; raise it to find their limit.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find how many concurrent calls serve.py sustains per worker count, against mock_realtime_server.py."
+    )
+    parser.add_argument('--workers', type=int, nargs='+', help="Worker counts to sweep (default 1, 2, 4 and all CPUs)")
+    parser.add_argument('--start-calls', type=int, default=20, help="Concurrent calls per worker in the first step")
+    parser.add_argument('--growth', type=float, default=1.5, help="Factor by which each step raises the call count")
+    parser.add_argument('--max-calls', type=int, default=2000, help="Stop raising the call count here")
+    parser.add_argument('--max-v2v-ms', type=float, default=1200, help="Voice-to-voice p95 target")
+    parser.add_argument('--max-jitter-ms', type=float, default=80, help="Outbound frame jitter p99 target")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds each call lasts")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Seconds over which each step's calls are started")
+    parser.add_argument('--talk-ms', type=int, default=1500, help="Length of each caller utterance")
+    parser.add_argument('--listen-ms', type=int, default=3500, help="Silence after each utterance")
+    parser.add_argument('--host', default="127.0.0.1", help="Bridge host")
+    parser.add_argument('--port', type=int, default=5050, help="Bridge port")
+    parser.add_argument('--mock-port', type=int, default=8765, help="Mock Realtime API port")
+    parser.add_argument('--response-ms', type=int, default=2000, help="Mock reply length")
+    parser.add_argument('--first-audio-delay-ms', type=int, default=300, help="Mock model latency")
+    if sys.platform != 'linux':
+        print("Server CPU is read from /proc; only calls and latency are reported on this platform")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,284 @@
+import csv
+import io
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout
+from urllib3.exceptions import NewConnectionError
+from twilio.base.exceptions import TwilioRestException
+from allow_list import AllowListUnavailable
+
+logger = logging.getLogger(__name__)
+
+def parse_numbers(body, content_type=''):
+    """Return the phone numbers in a JSON or CSV campaign upload, de-duplicated in order.
+
+    JSON may be a list of numbers or {"numbers": [...]}. CSV takes the first
+    column of every row, skipping a header row.
+    """
+    text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+    if 'json' in content_type or text.lstrip().startswith(('[', '{')):
+        data = json.loads(text)
+        numbers = data.get('numbers', []) if isinstance(data, dict) else data
+    else:
+        numbers = [row[0] for row in csv.reader(io.StringIO(text)) if row]
+    cleaned = (str(number).strip() for number in numbers)
+    return list(dict.fromkeys(n for n in cleaned if n and (n[0] == '+' or n[0].isdigit())))
+
+def is_transient(error):
+    """Whether a failed dial certainly placed no call and can simply be retried.
+
+    That is only the case when Twilio never accepted the request: the
+    connection could not be opened, Twilio answered 429 or 503, or the
+    allow-list could not be checked before dialing.
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status in (429, 503)
+    if isinstance(error, (AllowListUnavailable, ConnectTimeout)):
+        return True
+    if isinstance(error, RequestsConnectionError):
+        return bool(error.args) and isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
+
+def is_ambiguous(error):
+    """Whether Twilio may have created the call anyway: read timeouts, dropped connections, other 5xx."""
+    if isinstance(error, TwilioRestException):
+        return error.status >= 500
+    return isinstance(error, (asyncio.TimeoutError, OSError))
+
+class Campaign:
+    """A list of numbers being dialed, with per-number status."""
+
+    def __init__(self, numbers):
+        self.id = uuid.uuid4().hex[:12]
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.numbers = {
+            number: {"status": "queued", "attempts": 0, "call_sid": None, "error": None} for number in numbers
+        }
+
+    @property
+    def done(self):
+        return all(entry["status"] in ("called", "failed", "cancelled") for entry in self.numbers.values())
+
+    def progress(self, detail=False):
+        counts = {}
+        for entry in self.numbers.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        progress = {
+            "id": self.id,
+            "state": "cancelled" if self.cancelled else "finished" if self.done else "running",
+            "total": len(self.numbers),
+            "counts": counts,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if detail:
+            progress["numbers"] = self.numbers
+        return progress
+
+class CampaignDialer:
+    """Dial campaign numbers through dial(number) -> CallSid without blocking the server loop.
+
+    A single background task starts dials no faster than calls_per_second
+    and only while the bridge has room: calls in flight (live media streams
+    reported by active_calls(), calls placed but not yet streaming, and dials
+    in progress) stay below max_concurrency. Calls placed by the dialer
+    count as ringing until connected(call_sid) is called for their media
+    stream or ring_timeout passes. Transient failures are retried up to
+    retries times, waiting backoff seconds doubled on each attempt.
+
+    A dial that failed after Twilio may have accepted it (e.g. a read
+    timeout) is never blindly redialed: before the retry,
+    find_call(number, since) -> CallSid or None is asked whether a call to
+    the number was created since the failed attempt began, and the number
+    counts as called if so. Without find_call, or if that check fails, the
+    number fails rather than risk ringing the same person twice.
+
+    Capacity is judged from this process alone, so run one dialer per
+    deployment in a single-worker server. Finished and cancelled campaigns
+    are forgotten retention seconds after they end.
+    """
+
+    def __init__(self, dial, active_calls, calls_per_second=1.0, max_concurrency=10,
+                 retries=3, backoff=2.0, ring_timeout=60, find_call=None, retention=3600):
+        self.dial = dial
+        self.find_call = find_call
+        self.active_calls = active_calls
+        self.interval = 1 / calls_per_second
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.ring_timeout = ring_timeout
+        self.retention = retention
+        self.campaigns = {}
+        self.queue = asyncio.Queue()
+        self.ringing = {}  # call_sid -> monotonic time it was placed
+        self.dialing = 0
+        self.capacity_changed = asyncio.Event()
+        self.task = None
+        self.dials = set()
+        self.unconfirmed = {}  # (campaign id, number) -> UTC time of a dial that may have gone through
+        self.placed = 0
+        self.failures = 0
+        self.retried = 0
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop dialing; calls already placed are unaffected."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for task in list(self.dials):
+            task.cancel()
+
+    def prune(self):
+        """Forget campaigns that ended more than retention seconds ago."""
+        cutoff = time.time() - self.retention
+        for campaign_id, campaign in list(self.campaigns.items()):
+            if campaign.finished_at is not None and campaign.finished_at < cutoff:
+                del self.campaigns[campaign_id]
+
+    def submit(self, numbers):
+        """Queue a new campaign and return it."""
+        self.prune()
+        campaign = Campaign(numbers)
+        self.campaigns[campaign.id] = campaign
+        for number in campaign.numbers:
+            self.queue.put_nowait((campaign, number))
+        logger.info("Campaign %s queued with %d numbers", campaign.id, len(campaign.numbers))
+        self._finish(campaign)
+        return campaign
+
+    def cancel(self, campaign):
+        """Stop dialing a campaign's remaining numbers."""
+        campaign.cancelled = True
+        for entry in campaign.numbers.values():
+            if entry["status"] in ("queued", "retrying"):
+                entry["status"] = "cancelled"
+        for key in [key for key in self.unconfirmed if key[0] == campaign.id]:
+            del self.unconfirmed[key]
+        self._finish(campaign)
+
+    def connected(self, call_sid):
+        """Mark a dialer-placed call as streaming so it counts as an active call instead of ringing."""
+        if self.ringing.pop(call_sid, None) is not None:
+            self.capacity_changed.set()
+
+    def in_flight(self):
+        now = time.monotonic()
+        for call_sid, placed_at in list(self.ringing.items()):
+            if now - placed_at > self.ring_timeout:
+                del self.ringing[call_sid]
+        return self.active_calls() + len(self.ringing) + self.dialing
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "dialing": self.dialing,
+            "ringing": len(self.ringing),
+            "placed": self.placed,
+            "failures": self.failures,
+            "retried": self.retried,
+            "unconfirmed": len(self.unconfirmed),
+        }
+
+    async def _wait_for_capacity(self):
+        while self.in_flight() >= self.max_concurrency:
+            self.capacity_changed.clear()
+            try:
+                # Streams ending are not signalled, so poll as well
+                await asyncio.wait_for(self.capacity_changed.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        next_dial = time.monotonic()
+        while True:
+            campaign, number = await self.queue.get()
+            if campaign.cancelled:
+                continue
+            await self._wait_for_capacity()
+            delay = next_dial - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if campaign.cancelled:
+                continue
+            next_dial = time.monotonic() + self.interval
+            self.dialing += 1
+            task = asyncio.create_task(self._dial(campaign, number))
+            self.dials.add(task)
+            task.add_done_callback(self.dials.discard)
+
+    async def _dial(self, campaign, number):
+        entry = campaign.numbers[number]
+        entry["status"] = "dialing"
+        try:
+            since = self.unconfirmed.pop((campaign.id, number), None)
+            if since is not None:
+                # The last attempt may have gone through after all; never ring the number twice
+                try:
+                    call_sid = await self.find_call(number, since)
+                except Exception as e:
+                    self._fail(entry, number, f"Could not check whether an earlier attempt was placed: {e!r}")
+                    return
+                if call_sid:
+                    logger.info("Earlier dial to %s was placed after all: %s", number, call_sid)
+                    self._placed(entry, call_sid)
+                    return
+            entry["attempts"] += 1
+            started = datetime.now(timezone.utc)
+            try:
+                call_sid = await self.dial(number)
+            except Exception as e:
+                self._dial_failed(campaign, number, e, started)
+            else:
+                self._placed(entry, call_sid)
+        finally:
+            self.dialing -= 1
+            self.capacity_changed.set()
+            self._finish(campaign)
+
+    def _dial_failed(self, campaign, number, error, started):
+        entry = campaign.numbers[number]
+        unconfirmed = not is_transient(error) and is_ambiguous(error) and self.find_call is not None
+        if (is_transient(error) or unconfirmed) and entry["attempts"] <= self.retries and not campaign.cancelled:
+            if unconfirmed:
+                self.unconfirmed[(campaign.id, number)] = started
+            self.retried += 1
+            entry["status"] = "retrying"
+            entry["error"] = repr(error)
+            delay = self.backoff * 2 ** (entry["attempts"] - 1)
+            logger.warning("Dial to %s failed (%r), retrying in %.1f s", number, error, delay)
+            asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, (campaign, number))
+        else:
+            self._fail(entry, number, repr(error))
+
+    def _placed(self, entry, call_sid):
+        self.placed += 1
+        entry["status"] = "called"
+        entry["call_sid"] = call_sid
+        entry["error"] = None
+        self.ringing[call_sid] = time.monotonic()
+
+    def _fail(self, entry, number, error):
+        self.failures += 1
+        entry["status"] = "failed"
+        entry["error"] = error
+        logger.warning("Dial to %s failed: %s", number, error)
+
+    def _finish(self, campaign):
+        if campaign.finished_at is None and campaign.done:
+            campaign.finished_at = time.time()
+            logger.info("Campaign %s finished: %s", campaign.id, campaign.progress()["counts"])
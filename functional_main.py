@@ -4,19 +4,58 @@ import base64
 import asyncio
 import argparse
 from fastapi import FastAPI, WebSocket, BackgroundTasks, Form, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
+from fastapi import HTTPException
 from fastapi.websockets import WebSocketDisconnect
-from twilio.rest import Client
+from twilio_rest import TwilioRest
 import websockets
 from dotenv import load_dotenv, dotenv_values
-import uvicorn
 import re
+import hmac
 import time
 import sys
+import weakref
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from contextlib import asynccontextmanager
+from xml.sax.saxutils import quoteattr
+from serve import run_server
 from twilio.twiml.voice_response import VoiceResponse, Connect
+from twilio_media import (
+    media_frame_template, media_frame, mark_frame_template, mark_frame, base64_audio_ms, InboundAudioBatcher,
+    PlaybackTracker, OutboundPacer, TWILIO_MEDIA_PREFIX, ULAW_BYTES_PER_MS
+)
+from realtime_events import EventDispatcher, peek_string_field, loads
+from session_pool import RealtimeSessionPool, SpeculativeSessions
+from allow_list import AllowList, AllowListUnavailable
+from campaigns import CampaignDialer, parse_numbers
+from admission import AdmissionController, LoopLagMonitor
+from profiling import CallbackProfiler, profile_event_loop
+from greeting_cache import GreetingCache
+from prompt_library import PromptLibrary
+from local_vad import LocalVAD, VAD_AVAILABLE
+from silence_suppression import SilenceSuppressor
+from recorder import CallRecorder
+from transcripts import TranscriptAssembler, TranscriptStore, TRANSCRIPT_EVENT_TYPES
+from tools import ToolRegistry
+from session_profiles import SessionProfile, SessionProfiles
+from audio_dsp import (
+    NUMPY_AVAILABLE, PCM16_RATE, TWILIO_RATE, Resampler, LevelStats, ulaw_to_pcm16, pcm16_to_ulaw, ulaw_decode,
+    ulaw_encode, normalize_gain
+)
+from async_logging import setup_logging, bind_call, dropped_records
+from metrics import (
+    REGISTRY, CALLS_TOTAL, ACTIVE_CALLS, UPSTREAM_CONNECT_SECONDS, SESSION_UPDATE_ACK_SECONDS, EVENT_LOOP_LAG_SECONDS,
+    LOCAL_VAD_SPEECH_STARTS, LOCAL_VAD_BARGE_INS, LOCAL_VAD_CONFIRMED, LOCAL_VAD_UNCONFIRMED, LOCAL_VAD_LEAD_SECONDS,
+    RECORDING_DROPPED_SECONDS, CallTimer, record_pacer, record_suppressor, record_levels
+)
 
 load_dotenv()
 
+setup_logging(os.getenv('LOG_LEVEL', 'INFO').upper(), int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+logger = logging.getLogger(__name__)
+
 # Configuration
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -26,9 +65,9 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 # Get domain directly from .env file to ensure correct value
 env_config = dotenv_values(".env")
 raw_domain = env_config.get('DOMAIN', '')
-print(f"Domain from .env file: {raw_domain}")
+logger.info("Domain from .env file: %s", raw_domain)
 DOMAIN = re.sub(r'(^\w+:|^)\/\/|\/+$', '', raw_domain) # Strip protocols and trailing slashes from DOMAIN
-print(f"Processed domain for WebSocket URL: {DOMAIN}")
+logger.info("Processed domain for WebSocket URL: %s", DOMAIN)
 
 PORT = int(os.getenv('PORT', 5050))
 SYSTEM_MESSAGE = (
@@ -38,19 +77,181 @@ SYSTEM_MESSAGE = (
     "Always stay positive, but work in a joke when appropriate."
 )
 VOICE = 'alloy'
-LOG_EVENT_TYPES = [
+# Twilio Media Streams carry 8 kHz μ-law
+TWILIO_AUDIO_FORMAT = 'g711_ulaw'
+# Audio format of the OpenAI session; pcm16 converts to and from 24 kHz PCM on the bridge (needs numpy)
+AUDIO_FORMAT = os.getenv('OPENAI_AUDIO_FORMAT', TWILIO_AUDIO_FORMAT)
+if AUDIO_FORMAT not in (TWILIO_AUDIO_FORMAT, 'pcm16'):
+    raise ValueError(f"Unsupported OPENAI_AUDIO_FORMAT {AUDIO_FORMAT!r}")
+if AUDIO_FORMAT == 'pcm16' and not NUMPY_AVAILABLE:
+    logger.warning("OPENAI_AUDIO_FORMAT=pcm16 needs numpy; using %s", TWILIO_AUDIO_FORMAT)
+    AUDIO_FORMAT = TWILIO_AUDIO_FORMAT
+PCM16_SESSION = AUDIO_FORMAT == 'pcm16'
+GREETING = os.getenv('GREETING', (
+    "Hello there! I am an AI voice assistant powered by Twilio and the OpenAI Realtime API. "
+    "You can ask me for facts, jokes, or anything you can imagine. How can I help you?"
+))
+# Play a greeting rendered once and stored in GREETING_CACHE_DIR instead of asking the model on every call
+GREETING_CACHE = os.getenv('GREETING_CACHE', 'true').lower() == 'true'
+GREETING_CACHE_DIR = os.getenv('GREETING_CACHE_DIR', 'greeting_cache')
+# Loudness in dBFS the rendered greeting is normalized to; 0 keeps the model's level (needs numpy)
+GREETING_LEVEL_DB = float(os.getenv('GREETING_LEVEL_DB', 0))
+if GREETING_LEVEL_DB and not NUMPY_AVAILABLE:
+    logger.warning("GREETING_LEVEL_DB is set but numpy is not installed; keeping the greeting's level")
+    GREETING_LEVEL_DB = 0
+# Greetings normalized to another level are cached separately
+GREETING_FORMAT = f"{TWILIO_AUDIO_FORMAT}_{GREETING_LEVEL_DB:g}dB" if GREETING_LEVEL_DB else TWILIO_AUDIO_FORMAT
+# Client-chosen id of the greeting item injected into each conversation
+GREETING_ITEM_ID = 'item_cached_greeting'
+# Memory-mapped μ-law clips built with prompt_library.py; FALLBACK_PROMPT plays if OpenAI can't be reached
+PROMPT_LIBRARY = os.getenv('PROMPT_LIBRARY', 'prompts.ulib')
+FALLBACK_PROMPT = os.getenv('FALLBACK_PROMPT', 'fallback')
+LOG_EVENT_TYPES = frozenset([
     'error', 'response.content.done', 'rate_limits.updated', 'response.done',
     'input_audio_buffer.committed', 'input_audio_buffer.speech_stopped',
     'input_audio_buffer.speech_started', 'session.created'
-]
+])
+# Forward OpenAI audio deltas to Twilio untouched instead of decoding and re-encoding them
+AUDIO_PASSTHROUGH = os.getenv('AUDIO_PASSTHROUGH', 'true').lower() == 'true'
+# Milliseconds of caller audio to coalesce per input_audio_buffer.append (0 sends every Twilio frame)
+INBOUND_BATCH_MS = int(os.getenv('INBOUND_BATCH_MS', 100))
+# Follow each audio chunk with a Twilio mark so barge-in can truncate the reply at what the caller heard
+PLAYBACK_MARKS = os.getenv('PLAYBACK_MARKS', 'true').lower() == 'true'
+# Send outbound audio as 20 ms frames at real time plus OUTBOUND_LEAD_MS instead of as fast as OpenAI produces it
+OUTBOUND_PACING = os.getenv('OUTBOUND_PACING', 'true').lower() == 'true'
+OUTBOUND_LEAD_MS = int(os.getenv('OUTBOUND_LEAD_MS', 100))
+# Outbound audio held per call before reads from OpenAI are paused
+OUTBOUND_MAX_BUFFER_MS = int(os.getenv('OUTBOUND_MAX_BUFFER_MS', 30000))
+# Media streams one worker process will bridge at once (0 for no limit)
+MAX_CALLS_PER_WORKER = int(os.getenv('MAX_CALLS_PER_WORKER', 0))
+# Interrupt the assistant as soon as a local energy/zero-crossing VAD hears the caller (needs numpy)
+LOCAL_VAD = os.getenv('LOCAL_VAD', 'false').lower() == 'true'
+LOCAL_VAD_THRESHOLD_DB = float(os.getenv('LOCAL_VAD_THRESHOLD_DB', -40))
+LOCAL_VAD_MARGIN_DB = float(os.getenv('LOCAL_VAD_MARGIN_DB', 12))
+LOCAL_VAD_MAX_ZCR = float(os.getenv('LOCAL_VAD_MAX_ZCR', 0.35))
+LOCAL_VAD_START_MS = int(os.getenv('LOCAL_VAD_START_MS', 60))
+LOCAL_VAD_STOP_MS = int(os.getenv('LOCAL_VAD_STOP_MS', 400))
+# Seconds OpenAI has to confirm a local barge-in with speech_started before it counts as a false positive
+LOCAL_VAD_CONFIRM_SECONDS = float(os.getenv('LOCAL_VAD_CONFIRM_SECONDS', 2))
+if LOCAL_VAD and not VAD_AVAILABLE:
+    logger.warning("LOCAL_VAD is set but numpy is not installed; using OpenAI's VAD only")
+    LOCAL_VAD = False
+# Stop forwarding caller audio to OpenAI during sustained silence or comfort noise (needs numpy)
+SILENCE_SUPPRESSION = os.getenv('SILENCE_SUPPRESSION', 'false').lower() == 'true'
+SILENCE_THRESHOLD_DB = float(os.getenv('SILENCE_THRESHOLD_DB', -50))
+# Silence still forwarded after the caller goes quiet; keep it above OpenAI's VAD silence_duration_ms (500)
+SILENCE_HANGOVER_MS = int(os.getenv('SILENCE_HANGOVER_MS', 1000))
+# Suppressed audio replayed ahead of a speech onset, and how often one frame is let through while suppressing
+SILENCE_PREROLL_MS = int(os.getenv('SILENCE_PREROLL_MS', 100))
+SILENCE_KEEPALIVE_MS = int(os.getenv('SILENCE_KEEPALIVE_MS', 10000))
+if SILENCE_SUPPRESSION and not NUMPY_AVAILABLE:
+    logger.warning("SILENCE_SUPPRESSION is set but numpy is not installed; forwarding all caller audio")
+    SILENCE_SUPPRESSION = False
+# Measure each call's caller speech level and silence ratio for /metrics (on whenever numpy is installed)
+AUDIO_STATS = os.getenv('AUDIO_STATS', 'true').lower() == 'true' and NUMPY_AVAILABLE
+# Record both legs of every call as μ-law WAV files in RECORDING_DIR, written off the event loop
+RECORDING = os.getenv('RECORDING', 'false').lower() == 'true'
+RECORDING_DIR = os.getenv('RECORDING_DIR', 'recordings')
+# Audio held per call direction while the disk is behind, and across all calls waiting for the writer thread
+RECORDING_BUFFER_MS = int(os.getenv('RECORDING_BUFFER_MS', 10000))
+RECORDING_MAX_QUEUED_MS = int(os.getenv('RECORDING_MAX_QUEUED_MS', 120000))
+# Transcribe both sides of every call and keep the turns in TRANSCRIPT_DB (SQLite, written in batches)
+TRANSCRIPTS = os.getenv('TRANSCRIPTS', 'false').lower() == 'true'
+TRANSCRIPT_DB = os.getenv('TRANSCRIPT_DB', 'transcripts.db')
+TRANSCRIPTION_MODEL = os.getenv('TRANSCRIPTION_MODEL', 'whisper-1')
+# Bearer token required by GET /calls/{CallSid}/transcript; the endpoint is off while it is unset
+TRANSCRIPT_API_TOKEN = os.getenv('TRANSCRIPT_API_TOKEN')
+# Let the assistant call the functions registered on tool_registry
+TOOLS = os.getenv('TOOLS', 'false').lower() == 'true'
+# Tool calls running at once per worker, and tool results memoized across calls
+TOOL_CONCURRENCY = int(os.getenv('TOOL_CONCURRENCY', 8))
+TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', 256))
+# Named session profiles (instructions, voice, temperature, VAD, tools) selected per call; reloaded when the file changes
+SESSION_PROFILES = os.getenv('SESSION_PROFILES', 'session_profiles.json')
+SESSION_PROFILES_POLL = float(os.getenv('SESSION_PROFILES_POLL', 2))
+# Smoothed event-loop lag above which new calls are shed (0 disables)
+MAX_LOOP_LAG_MS = int(os.getenv('MAX_LOOP_LAG_MS', 200))
+# Seconds a call admitted by /incoming-call holds its slot while Twilio opens the media stream
+ADMISSION_RESERVATION_TTL = int(os.getenv('ADMISSION_RESERVATION_TTL', 30))
+# Key for the token that marks a media stream as admitted by /incoming-call; must be the same on every worker
+ADMISSION_SECRET = os.getenv('ADMISSION_SECRET') or os.getenv('TWILIO_AUTH_TOKEN')
+# Opt-in event-loop profiling: per-task callback timing, slow-callback log and /debug endpoints
+PROFILING = os.getenv('PROFILING', 'false').lower() == 'true'
+# Callbacks blocking the event loop longer than this are logged and kept for /debug/loop
+SLOW_CALLBACK_MS = int(os.getenv('SLOW_CALLBACK_MS', 20))
+# Longest sampling profile /debug/profile will run
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 60))
+BUSY_MESSAGE = os.getenv(
+    'BUSY_MESSAGE', "Sorry, all of our lines are busy right now. Please call back in a few minutes."
+)
+OPENAI_REALTIME_URL = os.getenv(
+    'OPENAI_REALTIME_URL', 'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
+)
+# Number of configured OpenAI sessions kept ready for incoming streams (0 disables the pool)
+SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', 2))
+# Seconds a pooled session may sit unused before it is closed and replaced; idle time shortens the call it serves
+SESSION_POOL_MAX_IDLE = int(os.getenv('SESSION_POOL_MAX_IDLE', 90))
+# Worker processes sharing the port; set by serve.py
+SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', 1))
+# Start the OpenAI session and greeting from the call webhooks, before Twilio opens the media stream.
+# Off by default with several workers: the stream lands on the worker that started it only 1 time in N
+SPECULATIVE_SESSIONS = os.getenv('SPECULATIVE_SESSIONS', str(SERVE_WORKERS == 1)).lower() == 'true'
+# Seconds a speculatively started session waits for its media stream before it is closed
+SPECULATIVE_SESSION_TTL = int(os.getenv('SPECULATIVE_SESSION_TTL', 60))
+# Seconds between bulk reloads of the outbound allow-list
+ALLOW_LIST_TTL = int(os.getenv('ALLOW_LIST_TTL', 300))
+# Seconds a number Twilio did not recognize is refused without asking again
+ALLOW_LIST_NEGATIVE_TTL = int(os.getenv('ALLOW_LIST_NEGATIVE_TTL', 60))
+# Outbound campaign dialing rate; Twilio accounts default to 1 call per second
+CAMPAIGN_CALLS_PER_SECOND = float(os.getenv('CAMPAIGN_CALLS_PER_SECOND', 1))
+# Live plus ringing calls above which the campaign dialer waits (defaults to the worker call cap)
+CAMPAIGN_MAX_CONCURRENCY = int(os.getenv('CAMPAIGN_MAX_CONCURRENCY', MAX_CALLS_PER_WORKER or 10))
+# Retries of a transiently failed dial, waiting CAMPAIGN_RETRY_BACKOFF seconds doubled per attempt
+CAMPAIGN_RETRIES = int(os.getenv('CAMPAIGN_RETRIES', 3))
+CAMPAIGN_RETRY_BACKOFF = float(os.getenv('CAMPAIGN_RETRY_BACKOFF', 2))
+# Seconds a placed campaign call counts against concurrency before its media stream connects
+CAMPAIGN_RING_TIMEOUT = int(os.getenv('CAMPAIGN_RING_TIMEOUT', 60))
+# Seconds a finished or cancelled campaign stays listed before it is forgotten
+CAMPAIGN_RETENTION = int(os.getenv('CAMPAIGN_RETENTION', 3600))
+# The dialer only sees this process's calls, so it refuses to run alongside other workers
+CAMPAIGNS_ENABLED = SERVE_WORKERS == 1
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services alongside the server."""
+    # Runs once per worker process, so every worker gets its own pool and sessions
+    logger.info("Worker %d starting", os.getpid())
+    await loop_lag.start()
+    await session_profiles.start()
+    greeting_task = asyncio.create_task(warm_greeting()) if GREETING_CACHE else None
+    if PROFILING:
+        callback_profiler.install()
+    await session_pool.start()
+    await allow_list.start()
+    if CAMPAIGNS_ENABLED:
+        await campaign_dialer.start()
+    yield
+    if greeting_task:
+        greeting_task.cancel()
+    await campaign_dialer.close()
+    await allow_list.close()
+    await speculative_sessions.close()
+    await session_pool.close()
+    twilio_rest.close()
+    await loop_lag.close()
+    callback_profiler.uninstall()
+    await asyncio.to_thread(call_recorder.close)
+    await transcript_store.close()
+    tool_registry.close()
+    await session_profiles.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER and OPENAI_API_KEY):
     raise ValueError('Missing Twilio and/or OpenAI environment variables. Please set them in the .env file.')
 
-# Initialize Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Twilio REST client; requests run on a thread pool so they never block the event loop
+twilio_rest = TwilioRest(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 @app.get('/', response_class=HTMLResponse)
 async def index_page():
@@ -93,117 +294,449 @@ async def index_page():
 @app.websocket('/media-stream')
 async def handle_media_stream(websocket: WebSocket):
     """Handle WebSocket connections between Twilio and OpenAI."""
-    print("WebSocket connection attempt received at /media-stream")
+    logger.debug("WebSocket connection attempt received at /media-stream")
+    # Admission waits for the start event: only its CallSid and parameters tell an admitted inbound call apart
     await websocket.accept()
-    print("WebSocket connection accepted")
+    ACTIVE_CALLS.inc()
+    logger.info("WebSocket connection accepted")
     stream_sid = None  # Define stream_sid at this scope level
+    media_prefix = None  # Serialized Twilio media frame prefix for stream_sid
+    mark_prefix = None  # Serialized Twilio mark frame prefix for stream_sid
+    call_sid = None
+    profile_name = None
+    admission_token = None
+    call_timer = CallTimer()
+    playback = PlaybackTracker()
+    pacer = pacer_task = None
+    recording = None
+    transcript = None
+    tool_tasks = set()
+    tool_calls = {}  # response_id -> tool tasks started by that response
+    function_names = {}  # call_id -> function name, from the function_call output item
+    local_items = set()  # Ids of audio played from the bridge itself, with nothing upstream to truncate
+    dropped_items = set()  # Interrupted items whose late audio deltas are discarded
+    last_item_id = None
+    local_barge_in_at = None
+    local_vad = LocalVAD(
+        LOCAL_VAD_THRESHOLD_DB, LOCAL_VAD_MARGIN_DB, LOCAL_VAD_MAX_ZCR, LOCAL_VAD_START_MS, LOCAL_VAD_STOP_MS
+    ) if LOCAL_VAD else None
+    suppressor = SilenceSuppressor(
+        SILENCE_THRESHOLD_DB, SILENCE_HANGOVER_MS, SILENCE_PREROLL_MS, SILENCE_KEEPALIVE_MS
+    ) if SILENCE_SUPPRESSION else None
+    caller_levels = LevelStats(SILENCE_THRESHOLD_DB) if AUDIO_STATS else None
 
     try:
-        url = 'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
-        print(f"Connecting to OpenAI at {url}")
-        
-        async with websockets.connect(
-            url,
-            additional_headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "OpenAI-Beta": "realtime=v1"
-            }
-        ) as openai_ws:
-            print("Connected to OpenAI WebSocket")
-            
-            # Initialize session and wait for confirmation
-            await initialize_session(openai_ws)
-            print("Session initialized with OpenAI")
-            
+        # Twilio sends 'connected' and then 'start'; its CallSid picks up a speculatively started session
+        async for message in websocket.iter_text():
+            data = json.loads(message)
+            if data['event'] == 'start':
+                stream_sid = data['start']['streamSid']
+                call_sid = data['start'].get('callSid')
+                custom_parameters = data['start'].get('customParameters', {})
+                profile_name = custom_parameters.get('profile')
+                admission_token = custom_parameters.get('admitted')
+                media_prefix = media_frame_template(stream_sid)
+                mark_prefix = mark_frame_template(stream_sid)
+                bind_call(stream_sid, call_sid)
+                campaign_dialer.connected(call_sid)
+                logger.info("Incoming stream has started")
+                break
+        if stream_sid is None:
+            logger.warning("Twilio stream closed before it started")
+            return
+        shed_reason = admission.admit_stream(call_sid, admission_token)
+        if shed_reason:
+            # Closing the stream makes Twilio move on to the next TwiML verb
+            logger.warning("Shedding media stream (%s)", shed_reason)
+            await websocket.close(code=1013)
+            return
+        if RECORDING:
+            recording = call_recorder.open(call_sid or stream_sid)
+        if TRANSCRIPTS:
+            transcript = TranscriptAssembler(call_sid or stream_sid, transcript_store.add)
+
+        assistant_played_until = 0.0  # When unpaced assistant audio sent so far finishes playing
+
+        def record_assistant(audio):
+            """Put sent assistant audio on the recording at the time it plays, not the time it was sent."""
+            nonlocal assistant_played_until
+            if OUTBOUND_PACING:
+                # Every paced frame goes through the pacer, which knows when it plays
+                played_at = pacer.frame_played_at
+            else:
+                played_at = max(time.monotonic(), assistant_played_until) + len(audio) / ULAW_BYTES_PER_MS / 1000
+                assistant_played_until = played_at
+            recording.assistant.write(audio, played_at)
+
+        async def send_media(payload):
+            await websocket.send_text(media_frame(media_prefix, payload))
+            if recording:
+                record_assistant(base64.b64decode(payload))
+
+        async def send_mark(item_id, duration_ms):
+            await websocket.send_text(mark_frame(mark_prefix, playback.sent(item_id, duration_ms)))
+
+        pacer = OutboundPacer(
+            send_media, send_mark if PLAYBACK_MARKS else None,
+            lead_ms=OUTBOUND_LEAD_MS, max_buffer_ms=OUTBOUND_MAX_BUFFER_MS
+        )
+        active_pacers.add(pacer)
+        pacer_task = asyncio.create_task(pacer.run())
+
+        async def play_audio(item_id, audio):
+            """Send audio that did not come from OpenAI, such as the cached greeting, to the caller."""
+            local_items.add(item_id)
+            if OUTBOUND_PACING:
+                await pacer.add(item_id, audio)
+                return
+            await send_media(base64.b64encode(audio).decode('ascii'))
+            if PLAYBACK_MARKS:
+                await send_mark(item_id, len(audio) // ULAW_BYTES_PER_MS)
+
+        async def play_prompt(name):
+            """Play a clip from the prompt library and return its duration in ms."""
+            await play_audio(f"prompt_{name}", prompt_library.clip(name))
+            return prompt_library.duration_ms(name)
+
+        if call_sid:
+            live_calls[call_sid] = play_prompt
+
+        profile = session_profiles.get(profile_name)
+        speculative = await speculative_sessions.claim(call_sid)
+        if speculative:
+            openai_ws, buffered_messages = speculative
+            # A buffered session.updated would be replayed late, so don't time it
+            openai_ws.session_update_sent_at = None
+            logger.info("Using speculatively started session")
+            greeting = cached_greeting(profile.voice) if getattr(openai_ws, 'greeting_cached', False) else None
+            if greeting:
+                await play_audio(GREETING_ITEM_ID, greeting)
+        else:
+            # Start the cached greeting right away; it plays while the session is acquired
+            greeting = cached_greeting(profile.voice)
+            if greeting:
+                await play_audio(GREETING_ITEM_ID, greeting)
+
+            # Take a pre-warmed, configured session, or connect now if none is ready
+            openai_ws = await session_pool.acquire()
+            buffered_messages = []
+            await apply_profile(openai_ws, profile)
+
+            # Have the AI speak first
+            await start_conversation(openai_ws, greeting is not None)
+        CALLS_TOTAL.inc()
+        try:
+            logger.debug("Session initialized with OpenAI")
+
+            # Coalesce 20 ms Twilio frames into fewer upstream appends
+            convert_inbound = None
+            if PCM16_SESSION:
+                upsampler = Resampler(TWILIO_RATE, PCM16_RATE)
+                downsampler = Resampler(PCM16_RATE, TWILIO_RATE)
+                convert_inbound = lambda ulaw: ulaw_to_pcm16(ulaw, upsampler)
+            inbound_batcher = InboundAudioBatcher(openai_ws.send, INBOUND_BATCH_MS, convert_inbound)
+
             # Define helper functions with proper access to stream_sid
             async def receive_from_twilio():
-                nonlocal stream_sid
+                nonlocal stream_sid, media_prefix, mark_prefix
                 try:
                     async for message in websocket.iter_text():
-                        data = json.loads(message)
-                        if data['event'] == 'media':
+                        # Media frames dominate inbound traffic, so slice their payload out without parsing
+                        payload = None
+                        if message.startswith(TWILIO_MEDIA_PREFIX):
+                            payload = peek_string_field(message, 'payload')
+                        if payload is None:
+                            data = json.loads(message)
+                            if data['event'] == 'media':
+                                payload = data['media']['payload']
+
+                        if payload is not None:
+                            call_timer.inbound_frame()
+                            audio = base64.b64decode(payload) if local_vad or suppressor or recording or caller_levels else None
+                            if recording:
+                                recording.caller.write(audio)
+                            if caller_levels:
+                                caller_levels.frame(audio)
+                            vad_event = local_vad.frame(audio) if local_vad else None
+                            if vad_event == 'speech_started':
+                                await handle_local_speech_started()
+                            forward = suppressor.frame(payload, audio) if suppressor else (payload,)
                             try:
-                                audio_append = {
-                                    "type": "input_audio_buffer.append",
-                                    "audio": data['media']['payload']
-                                }
-                                await openai_ws.send(json.dumps(audio_append))
-                                # Uncomment for verbose logging
-                                # print("Sent audio to OpenAI")
+                                for held in forward:
+                                    await inbound_batcher.add(held)
+                                if vad_event or not forward:
+                                    # Don't leave the onset or tail of an utterance waiting for the batch window
+                                    await inbound_batcher.flush()
+                                logger.debug("Sent audio to OpenAI", extra={'sample_every': 100})
                             except websockets.exceptions.ConnectionClosed:
-                                print("OpenAI WebSocket connection is closed")
+                                logger.warning("OpenAI WebSocket connection is closed")
                                 break
                         elif data['event'] == 'start':
                             stream_sid = data['start']['streamSid']
-                            print(f"Incoming stream has started {stream_sid}")
+                            media_prefix = media_frame_template(stream_sid)
+                            mark_prefix = mark_frame_template(stream_sid)
+                            logger.info("Incoming stream has started %s", stream_sid)
+                        elif data['event'] == 'mark':
+                            playback.acknowledged(data['mark']['name'])
                         elif data['event'] == 'stop':
-                            print(f"Stream {stream_sid} has stopped")
+                            logger.info("Stream %s has stopped", stream_sid)
+                            await inbound_batcher.flush()
+                            if recording:
+                                recording.close()
+                            logger.info("Sent %d appends for %d Twilio frames", inbound_batcher.appends_out, inbound_batcher.frames_in)
+                            if suppressor:
+                                logger.info(
+                                    "Suppressed %d silent frames (%d bytes) in %d stretches",
+                                    suppressor.frames_suppressed, suppressor.bytes_suppressed, suppressor.suppressions
+                                )
+                            if caller_levels:
+                                caller_levels.flush()
+                                if caller_levels.speech_level_db is not None:
+                                    logger.info(
+                                        "Caller speech level %.1f dBFS, %.0f%% silence",
+                                        caller_levels.speech_level_db, caller_levels.silence_ratio * 100
+                                    )
                 except WebSocketDisconnect:
-                    print("Twilio client disconnected")
+                    logger.info("Twilio client disconnected")
+                except Exception as e:
+                    logger.error("Error in receive_from_twilio: %s", e)
+                finally:
+                    # The call is over; closing OpenAI ends send_to_twilio too
+                    await openai_ws.close()
+
+            dispatcher = EventDispatcher()
+
+            async def interrupt_assistant(interrupted_at):
+                """Stop the assistant's audio at Twilio and cancel the rest of the response upstream."""
+                nonlocal assistant_played_until
+                truncation = playback.interrupt()
+                pacer.flush()
+                # Twilio drops what it had not played yet
+                assistant_played_until = 0.0
+                # Deltas of the interrupted item may still be in flight
+                if last_item_id:
+                    dropped_items.add(last_item_id)
+
+                # Clear Twilio buffer
+                if stream_sid:
+                    clear_twilio = {
+                        "streamSid": stream_sid,
+                        "event": "clear"
+                    }
+                    await websocket.send_json(clear_twilio)
+                    call_timer.cleared(interrupted_at)
+                    logger.debug('Cleared Twilio buffer.')
+
+                # Drop the part of the answer the caller never heard from the conversation
+                if truncation and truncation[0] not in local_items:
+                    item_id, audio_end_ms = truncation
+                    truncate_message = {
+                        "type": "conversation.item.truncate",
+                        "item_id": item_id,
+                        "content_index": 0,
+                        "audio_end_ms": audio_end_ms
+                    }
+                    await openai_ws.send(json.dumps(truncate_message))
+                    logger.debug('Truncated item %s at %d ms.', item_id, audio_end_ms)
+
+                # Send interrupt message to OpenAI
+                interrupt_message = {
+                    "type": "response.cancel"
+                }
+                await openai_ws.send(json.dumps(interrupt_message))
+                logger.debug('Cancelling AI speech from the server.')
+
+            # Add handling for speech detection to interrupt AI
+            @dispatcher.on('input_audio_buffer.speech_started', raw=True)
+            async def handle_speech_started(message):
+                nonlocal local_barge_in_at
+                logger.info('Speech Start: input_audio_buffer.speech_started')
+                interrupted_at = call_timer.speech_started()
+                # Send the rest of the onset now rather than at the end of the batch window
+                await inbound_batcher.flush()
+                if local_barge_in_at is not None:
+                    # The local VAD already interrupted this utterance
+                    LOCAL_VAD_CONFIRMED.inc()
+                    LOCAL_VAD_LEAD_SECONDS.observe(interrupted_at - local_barge_in_at)
+                    local_barge_in_at = None
+                    return
+                await interrupt_assistant(interrupted_at)
+
+            async def handle_local_speech_started():
+                nonlocal local_barge_in_at
+                LOCAL_VAD_SPEECH_STARTS.inc()
+                # With nothing playing there is nothing to interrupt; turn-taking stays with OpenAI's VAD
+                if local_barge_in_at is not None or not (pacer.buffered_ms or playback.pending):
+                    return
+                logger.info('Speech Start: local VAD')
+                barge_in_at = local_barge_in_at = call_timer.speech_started()
+                LOCAL_VAD_BARGE_INS.inc()
+                await interrupt_assistant(barge_in_at)
+
+                def expire():
+                    nonlocal local_barge_in_at
+                    if local_barge_in_at == barge_in_at:
+                        LOCAL_VAD_UNCONFIRMED.inc()
+                        local_barge_in_at = None
+
+                asyncio.get_running_loop().call_later(LOCAL_VAD_CONFIRM_SECONDS, expire)
+
+            @dispatcher.on('input_audio_buffer.speech_stopped', raw=True)
+            async def handle_speech_stopped(message):
+                call_timer.speech_stopped()
+                await inbound_batcher.flush()
+
+            if transcript:
+                @dispatcher.on(*TRANSCRIPT_EVENT_TYPES)
+                async def handle_transcript(event):
+                    transcript.handle(event)
+
+            if TOOLS:
+                async def run_tool(call_id, name, arguments):
+                    if name:
+                        output = await tool_registry.call(name, arguments)
+                    else:
+                        output = json.dumps({"error": "The function call had no name"})
+                    await openai_ws.send(json.dumps({
+                        "type": "conversation.item.create",
+                        "item": {"type": "function_call_output", "call_id": call_id, "output": output}
+                    }))
+
+                async def answer_tool_calls(tasks, status):
+                    await asyncio.gather(*tasks)
+                    # A cancelled response means the caller spoke; their turn starts the next response
+                    if status == 'completed':
+                        await openai_ws.send(json.dumps({"type": "response.create"}))
+
+                def track(task):
+                    tool_tasks.add(task)
+                    task.add_done_callback(tool_tasks.discard)
+                    return task
+
+                @dispatcher.on('response.output_item.added', 'response.output_item.done')
+                async def handle_output_item(event):
+                    item = event.get('item') or {}
+                    if item.get('type') == 'function_call' and item.get('call_id') and item.get('name'):
+                        function_names[item['call_id']] = item['name']
+
+                @dispatcher.on('response.function_call_arguments.done')
+                async def handle_function_call(event):
+                    call_id = event.get('call_id')
+                    name = event.get('name') or function_names.get(call_id)
+                    function_names.pop(call_id, None)
+                    if not call_id:
+                        logger.warning("Ignoring function call without a call_id: %s", event)
+                        return
+                    # Run the tool in the background so audio keeps flowing while it works
+                    logger.info("Calling tool %s", name)
+                    task = track(asyncio.create_task(run_tool(call_id, name, event.get('arguments'))))
+                    tool_calls.setdefault(event.get('response_id'), []).append(task)
+
+                @dispatcher.on('response.done')
+                async def handle_response_done(event):
+                    response = event.get('response') or {}
+                    for item in response.get('output') or ():
+                        function_names.pop(item.get('call_id'), None)
+                    tasks = tool_calls.pop(response.get('id'), None)
+                    if tasks:
+                        track(asyncio.create_task(answer_tool_calls(tasks, response.get('status'))))
+
+            @dispatcher.on('session.updated')
+            async def handle_session_updated(response):
+                observe_session_ack(openai_ws)
+                logger.debug("Session updated successfully: %s", response)
+
+            @dispatcher.on('response.audio.delta', raw=True)
+            async def handle_audio_delta(message):
+                nonlocal last_item_id
+                delta = peek_string_field(message, 'delta')
+                item_id = peek_string_field(message, 'item_id')
+                if delta is None or item_id is None:
+                    response = loads(message)
+                    delta, item_id = response.get('delta'), response.get('item_id')
+                if not delta or item_id in dropped_items:
+                    return
+                if PCM16_SESSION:
+                    delta = base64.b64encode(pcm16_to_ulaw(base64.b64decode(delta), downsampler)).decode('ascii')
+                if not stream_sid:
+                    logger.warning("No stream_sid available yet", extra={'sample_every': 50})
+                    return
+
+                last_item_id = item_id
+                call_timer.outbound_frame()
+                try:
+                    if OUTBOUND_PACING:
+                        await pacer.add(item_id, base64.b64decode(delta))
+                        return
+
+                    if AUDIO_PASSTHROUGH:
+                        await send_media(delta)
+                    else:
+                        audio_payload = base64.b64encode(base64.b64decode(delta)).decode('utf-8')
+                        audio_delta = {
+                            "event": "media",
+                            "streamSid": stream_sid,
+                            "media": {
+                                "payload": audio_payload
+                            }
+                        }
+                        await websocket.send_json(audio_delta)
+                        if recording:
+                            record_assistant(base64.b64decode(audio_payload))
+                    logger.debug("Sent audio to Twilio", extra={'sample_every': 100})
+
+                    if PLAYBACK_MARKS:
+                        await send_mark(item_id, base64_audio_ms(delta))
                 except Exception as e:
-                    print(f"Error in receive_from_twilio: {e}")
+                    logger.error("Error processing audio data: %s", e)
 
             async def send_to_twilio():
                 try:
                     async for openai_message in openai_ws:
-                        response = json.loads(openai_message)
-                        if response['type'] in LOG_EVENT_TYPES:
-                            print(f"Received event: {response['type']}")
-                        
-                        # Add handling for speech detection to interrupt AI
-                        if response["type"] == "input_audio_buffer.speech_started":
-                            print('Speech Start:', response['type'])
-                            
-                            # Clear Twilio buffer
-                            if stream_sid:
-                                clear_twilio = {
-                                    "streamSid": stream_sid,
-                                    "event": "clear"
-                                }
-                                await websocket.send_json(clear_twilio)
-                                print('Cleared Twilio buffer.')
-                            
-                            # Send interrupt message to OpenAI
-                            interrupt_message = {
-                                "type": "response.cancel"
-                            }
-                            await openai_ws.send(json.dumps(interrupt_message))
-                            print('Cancelling AI speech from the server.')
-                        
-                        if response['type'] == 'session.updated':
-                            print("Session updated successfully:", response)
-                        
-                        if response['type'] == 'response.audio.delta' and response.get('delta'):
-                            if not stream_sid:
-                                print("Warning: No stream_sid available yet")
-                                continue
-                                
-                            try:
-                                audio_payload = base64.b64encode(base64.b64decode(response['delta'])).decode('utf-8')
-                                audio_delta = {
-                                    "event": "media",
-                                    "streamSid": stream_sid,
-                                    "media": {
-                                        "payload": audio_payload
-                                    }
-                                }
-                                await websocket.send_json(audio_delta)
-                                # Uncomment for verbose logging
-                                # print("Sent audio to Twilio")
-                            except Exception as e:
-                                print(f"Error processing audio data: {e}")
+                        event_type = await dispatcher.dispatch(openai_message)
+                        if event_type in LOG_EVENT_TYPES:
+                            logger.info("Received event: %s", event_type)
                 except websockets.exceptions.ConnectionClosed:
-                    print("OpenAI WebSocket connection closed")
+                    logger.info("OpenAI WebSocket connection closed")
                 except Exception as e:
-                    print(f"Error in send_to_twilio: {e}")
+                    logger.error("Error in send_to_twilio: %s", e)
+
+            # Flush what the speculative session produced (greeting audio first) now that the stream exists
+            for message in buffered_messages:
+                await dispatcher.dispatch(message)
 
             # Run both tasks concurrently
             await asyncio.gather(receive_from_twilio(), send_to_twilio())
-            
+        finally:
+            await openai_ws.close()
+
     except Exception as e:
-        print(f"Failed to connect to OpenAI: {e}")
+        logger.error("Failed to connect to OpenAI: %s", e)
+        # Apologize from the prompt library rather than hanging up in silence
+        if pacer_task and prompt_library and FALLBACK_PROMPT in prompt_library:
+            try:
+                await play_audio(f"prompt_{FALLBACK_PROMPT}", prompt_library.clip(FALLBACK_PROMPT))
+                await asyncio.sleep(prompt_library.duration_ms(FALLBACK_PROMPT) / 1000 + 0.5)
+            except Exception as e:
+                logger.warning("Failed to play fallback prompt: %s", e)
     finally:
-        print("Closing WebSocket connection")
+        live_calls.pop(call_sid, None)
+        if pacer_task:
+            pacer_task.cancel()
+            record_pacer(pacer)
+        if suppressor:
+            record_suppressor(suppressor)
+        if caller_levels:
+            record_levels(caller_levels)
+        if recording:
+            recording.close()
+            RECORDING_DROPPED_SECONDS.inc(recording.dropped_bytes / ULAW_BYTES_PER_MS / 1000)
+        if transcript:
+            transcript.close()
+        for task in tool_tasks:
+            task.cancel()
+        ACTIVE_CALLS.dec()
+        logger.debug("Closing WebSocket connection")
         try:
             await websocket.close()
         except:
@@ -219,11 +752,7 @@ async def send_initial_conversation_item(openai_ws):
             "content": [
                 {
                     "type": "input_text",
-                    "text": (
-                        "Greet the user with 'Hello there! I am an AI voice assistant powered by "
-                        "Twilio and the OpenAI Realtime API. You can ask me for facts, jokes, or "
-                        "anything you can imagine. How can I help you?'"
-                    )
+                    "text": f"Greet the user with '{GREETING}'"
                 }
             ]
         }
@@ -231,25 +760,416 @@ async def send_initial_conversation_item(openai_ws):
     await openai_ws.send(json.dumps(initial_conversation_item))
     await openai_ws.send(json.dumps({"type": "response.create"}))
 
-async def initialize_session(openai_ws):
-    """Control initial session with OpenAI."""
-    session_update = {
-        "type": "session.update",
-        "session": {
-            "turn_detection": {"type": "server_vad"},
-            "input_audio_format": "g711_ulaw",
-            "output_audio_format": "g711_ulaw",
-            "voice": VOICE,
-            "instructions": SYSTEM_MESSAGE,
-            "modalities": ["text", "audio"],
-            "temperature": 0.8,
+async def send_greeting_item(openai_ws):
+    """Add the cached greeting to the conversation as if the assistant had said it."""
+    greeting_item = {
+        "type": "conversation.item.create",
+        "item": {
+            "id": GREETING_ITEM_ID,
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": GREETING}]
+        }
+    }
+    await openai_ws.send(json.dumps(greeting_item))
+
+async def start_conversation(openai_ws, greeting_cached=None):
+    """Open the conversation with the cached greeting if there is one, otherwise have the model greet."""
+    if greeting_cached is None:
+        greeting_cached = cached_greeting(openai_ws.profile.voice) is not None
+    # The media stream reads this to know whether it must play the cached audio itself
+    openai_ws.greeting_cached = greeting_cached
+    if greeting_cached:
+        await send_greeting_item(openai_ws)
+    else:
+        await send_initial_conversation_item(openai_ws)
+
+async def prepare_speculative_session(openai_ws, profile_name=None):
+    """Configure a speculatively started session for its call's profile and have it greet."""
+    await apply_profile(openai_ws, session_profiles.get(profile_name))
+    await start_conversation(openai_ws)
+
+def cached_greeting(voice=VOICE):
+    """Return the pre-rendered greeting audio, or None if it is disabled or not rendered yet."""
+    return greeting_cache.get(voice, GREETING, GREETING_FORMAT) if GREETING_CACHE else None
+
+async def render_greeting(voice, text, audio_format):
+    """Have the model speak text on a throwaway session and return the audio as Twilio μ-law."""
+    openai_ws = await connect_to_openai(SessionProfile(f"greeting-{voice}", build_session({"voice": voice})))
+    try:
+        await openai_ws.send(json.dumps({
+            "type": "response.create",
+            "response": {
+                "modalities": ["text", "audio"],
+                "instructions": f"Say exactly the following, word for word, and nothing else: {text}",
+            }
+        }))
+        audio = bytearray()
+
+        async def collect():
+            async for message in openai_ws:
+                response = loads(message)
+                if response['type'] == 'response.audio.delta':
+                    audio.extend(base64.b64decode(response['delta']))
+                elif response['type'] == 'response.done':
+                    status = response['response'].get('status')
+                    if status != 'completed':
+                        raise RuntimeError(f"Greeting response {status}")
+                    return
+                elif response['type'] == 'error':
+                    raise RuntimeError(response.get('error'))
+
+        await asyncio.wait_for(collect(), 60)
+        ulaw = pcm16_to_ulaw(audio, Resampler(PCM16_RATE, TWILIO_RATE)) if PCM16_SESSION else bytes(audio)
+        if GREETING_LEVEL_DB:
+            ulaw = ulaw_encode(normalize_gain(ulaw_decode(ulaw), GREETING_LEVEL_DB))
+        return ulaw
+    finally:
+        await openai_ws.close()
+
+async def warm_greeting():
+    """Render the greeting for every profile's voice into the cache in the background."""
+    for voice in sorted({profile.voice for profile in session_profiles.profiles.values()}):
+        try:
+            await greeting_cache.ensure(voice, GREETING, GREETING_FORMAT)
+        except Exception as e:
+            logger.warning("Failed to render the %s greeting; the model will greet those calls: %r", voice, e)
+
+def build_session(settings):
+    """Merge a session profile's settings over the defaults into a session.update session."""
+    tool_names = settings.pop('tools', None)
+    session = {
+        "turn_detection": {"type": "server_vad"},
+        "voice": VOICE,
+        "instructions": SYSTEM_MESSAGE,
+        "modalities": ["text", "audio"],
+        "temperature": 0.8,
+    }
+    if TRANSCRIPTS:
+        session["input_audio_transcription"] = {"model": TRANSCRIPTION_MODEL}
+    if TOOLS:
+        tools = tool_registry.definitions()
+        if tool_names is not None:
+            unknown = set(tool_names) - tool_registry.tools.keys()
+            if unknown:
+                raise ValueError(f"Unknown tools {sorted(unknown)}")
+            tools = [tool for tool in tools if tool["name"] in tool_names]
+        if tools:
+            session["tools"] = tools
+            session["tool_choice"] = "auto"
+    session.update(settings)
+    # The bridge converts audio for this format, so profiles can't change it
+    session["input_audio_format"] = session["output_audio_format"] = AUDIO_FORMAT
+    return session
+
+async def initialize_session(openai_ws, profile=None):
+    """Configure the session with a profile's precompiled session.update, the default profile if None."""
+    profile = profile or session_profiles.get()
+    logger.debug('Sending session profile %s', profile.name)
+    openai_ws.profile = profile
+    openai_ws.session_update_sent_at = time.monotonic()
+    await openai_ws.send(profile.payload)
+
+async def apply_profile(openai_ws, profile):
+    """Reconfigure a session set up with another profile, or with an older version of this one."""
+    current = getattr(openai_ws, 'profile', None)
+    if current is None or current.payload != profile.payload:
+        await initialize_session(openai_ws, profile)
+
+def observe_session_ack(openai_ws):
+    """Record how long the server took to acknowledge this session's session.update."""
+    sent_at = getattr(openai_ws, 'session_update_sent_at', None)
+    if sent_at is not None:
+        SESSION_UPDATE_ACK_SECONDS.observe(time.monotonic() - sent_at)
+        openai_ws.session_update_sent_at = None
+
+async def connect_to_openai(profile=None):
+    """Open a Realtime API WebSocket and send its session configuration."""
+    logger.debug("Connecting to OpenAI at %s", OPENAI_REALTIME_URL)
+    started = time.monotonic()
+    openai_ws = await websockets.connect(
+        OPENAI_REALTIME_URL,
+        additional_headers={
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "OpenAI-Beta": "realtime=v1"
         }
+    )
+    UPSTREAM_CONNECT_SECONDS.observe(time.monotonic() - started)
+    logger.debug("Connected to OpenAI WebSocket")
+    await initialize_session(openai_ws, profile)
+    return openai_ws
+
+# Outbound pacers of calls in progress, for the buffered audio gauge
+active_pacers = weakref.WeakSet()
+
+# Writer thread for call recordings; started by the first recorded call
+call_recorder = CallRecorder(RECORDING_DIR, buffer_ms=RECORDING_BUFFER_MS, max_queued_ms=RECORDING_MAX_QUEUED_MS)
+# Functions the assistant may call when TOOLS is enabled; register more with @tool_registry.tool(...)
+tool_registry = ToolRegistry(TOOL_CONCURRENCY, TOOL_CACHE_SIZE)
+
+@tool_registry.tool(
+    "Get the current date and time in a time zone.",
+    {
+        "type": "object",
+        "properties": {"timezone": {"type": "string", "description": "IANA time zone, e.g. America/New_York"}},
+    },
+    timeout=1.0,
+)
+def get_current_time(timezone='UTC'):
+    return {"timezone": timezone, "time": datetime.now(ZoneInfo(timezone)).isoformat(timespec='minutes')}
+
+for stat, description in [
+    ('calls', "Tool calls requested by the assistant"),
+    ('cache_hits', "Tool calls answered from the result cache"),
+    ('timeouts', "Tool calls abandoned after their timeout"),
+    ('errors', "Tool calls that failed or named an unknown tool"),
+]:
+    REGISTRY.counter(f'bridge_tool_{stat}_total', description, fn=lambda stat=stat: getattr(tool_registry, stat))
+REGISTRY.gauge(
+    'bridge_tool_overrunning', "Timed-out tool functions still holding a thread and a concurrency slot",
+    fn=lambda: tool_registry.overrunning
+)
+
+session_profiles = SessionProfiles(
+    SESSION_PROFILES, build_session, SESSION_PROFILES_POLL,
+    on_reload=lambda: asyncio.create_task(warm_greeting()) if GREETING_CACHE else None
+)
+REGISTRY.gauge('bridge_session_profiles', "Session profiles loaded", fn=lambda: len(session_profiles.profiles))
+REGISTRY.counter('bridge_session_profile_reloads_total', "Session profile file loads", fn=lambda: session_profiles.reloads)
+REGISTRY.counter(
+    'bridge_session_profile_reload_failures_total', "Session profile file loads rejected as invalid",
+    fn=lambda: session_profiles.reload_failures
+)
+
+# Batched transcript writer; its task starts with the first completed turn
+transcript_store = TranscriptStore(TRANSCRIPT_DB)
+REGISTRY.counter('bridge_transcript_turns_written_total', "Transcript turns written to TRANSCRIPT_DB", fn=lambda: transcript_store.turns_written)
+REGISTRY.counter('bridge_transcript_batches_total', "Transcript write transactions", fn=lambda: transcript_store.batches)
+REGISTRY.counter('bridge_transcript_write_errors_total', "Failed transcript write transactions", fn=lambda: transcript_store.write_errors)
+
+loop_lag = LoopLagMonitor(histogram=EVENT_LOOP_LAG_SECONDS)
+admission = AdmissionController(
+    lambda: ACTIVE_CALLS.value, max_calls=MAX_CALLS_PER_WORKER, lag_monitor=loop_lag,
+    max_lag=MAX_LOOP_LAG_MS / 1000, reservation_ttl=ADMISSION_RESERVATION_TTL, secret=ADMISSION_SECRET,
+)
+REGISTRY.gauge('bridge_event_loop_lag_smoothed_seconds', "Smoothed event-loop lag used for load shedding", fn=lambda: loop_lag.lag)
+REGISTRY.gauge('bridge_admission_reserved_calls', "Inbound calls admitted whose media stream has not started", fn=admission.reserved)
+REGISTRY.counter('bridge_admission_admitted_total', "Calls admitted by admission control", fn=lambda: admission.admitted)
+REGISTRY.counter(
+    'bridge_admission_admitted_elsewhere_total', "Media streams of inbound calls admitted by another worker's webhook",
+    fn=lambda: admission.admitted_elsewhere
+)
+REGISTRY.counter(
+    'bridge_admission_bad_tokens_total', "Media streams whose admitted token did not match their CallSid",
+    fn=lambda: admission.bad_tokens
+)
+for where, reason, description in [
+    ('incoming', 'call_limit', "Incoming calls answered with the busy message because the worker was full"),
+    ('incoming', 'loop_lag', "Incoming calls answered with the busy message because the event loop was lagging"),
+    ('stream', 'call_limit', "Media streams refused because the worker was full"),
+    ('stream', 'loop_lag', "Media streams refused because the event loop was lagging"),
+]:
+    REGISTRY.counter(
+        f'bridge_admission_shed_{where}_{reason}_total', description, fn=lambda key=(where, reason): admission.shed[key]
+    )
+
+session_pool = RealtimeSessionPool(
+    connect_to_openai, SESSION_POOL_SIZE, max_idle=SESSION_POOL_MAX_IDLE, on_ready=observe_session_ack
+)
+speculative_sessions = SpeculativeSessions(session_pool, prepare_speculative_session, ttl=SPECULATIVE_SESSION_TTL)
+greeting_cache = GreetingCache(GREETING_CACHE_DIR, render_greeting)
+
+def start_speculative_session(call_sid, profile_name=None):
+    """Prepare the OpenAI session for a call while Twilio is still playing its TwiML preamble."""
+    if SPECULATIVE_SESSIONS:
+        speculative_sessions.start(call_sid, profile_name)
+
+REGISTRY.counter(
+    'bridge_log_records_dropped_total', "Log records discarded because the log queue was full", fn=dropped_records
+)
+REGISTRY.gauge(
+    'bridge_recording_backlog_seconds', "Recorded audio waiting for the writer thread",
+    fn=lambda: call_recorder.backlog_seconds
+)
+REGISTRY.counter('bridge_recordings_total', "Calls recorded", fn=lambda: call_recorder.recordings)
+REGISTRY.counter('bridge_recording_write_errors_total', "Failed recording writes", fn=lambda: call_recorder.write_errors)
+REGISTRY.gauge(
+    'bridge_outbound_buffered_seconds', "Outbound audio queued for pacing across active calls",
+    fn=lambda: sum(pacer.buffered_ms for pacer in active_pacers) / 1000
+)
+REGISTRY.gauge(
+    'bridge_session_pool_idle', "Pre-warmed OpenAI sessions ready for a call",
+    fn=lambda: session_pool.stats()['idle']
+)
+REGISTRY.gauge(
+    'bridge_speculative_sessions_pending', "Speculatively started sessions waiting for their media stream",
+    fn=lambda: speculative_sessions.stats()['pending']
+)
+for stat, description in [
+    ('hits', "Media streams served from the session pool"),
+    ('misses', "Media streams that found the session pool empty"),
+    ('expired', "Pooled sessions closed after idling too long"),
+    ('refill_failures', "Failed attempts to pre-warm a pooled session"),
+    ('refill_count', "Pooled sessions successfully pre-warmed"),
+    ('refill_seconds_total', "Total time spent connecting and configuring pooled sessions"),
+]:
+    name = stat if stat.endswith('_total') else f'{stat}_total'
+    REGISTRY.counter(f'bridge_session_pool_{name}', description, fn=lambda stat=stat: session_pool.stats()[stat])
+for stat, description in [
+    ('claimed', "Speculatively started sessions claimed by their media stream"),
+    ('expired', "Speculatively started sessions closed unclaimed"),
+]:
+    REGISTRY.counter(
+        f'bridge_speculative_sessions_{stat}_total', description, fn=lambda stat=stat: speculative_sessions.stats()[stat]
+    )
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """Export bridge latency histograms and counters in Prometheus format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get('/admission', response_class=JSONResponse)
+async def admission_stats():
+    """Report call slots, event-loop lag and shed counts."""
+    return admission.stats()
+
+callback_profiler = CallbackProfiler(slow_threshold=SLOW_CALLBACK_MS / 1000)
+
+def require_profiling():
+    if not PROFILING:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILING=true")
+
+@app.get('/debug/loop', response_class=JSONResponse)
+async def debug_loop():
+    """Report event-loop lag, per-task callback CPU time and recent slow callbacks."""
+    require_profiling()
+    return {
+        "loop_lag_seconds": {"smoothed": loop_lag.lag, "last": loop_lag.last_lag, "max": loop_lag.max_lag},
+        **callback_profiler.report(),
     }
-    print('Sending session update:', json.dumps(session_update))
-    await openai_ws.send(json.dumps(session_update))
 
-    # Have the AI speak first
-    await send_initial_conversation_item(openai_ws)
+@app.get('/debug/profile', response_class=PlainTextResponse)
+async def debug_profile(seconds: float = 10, interval_ms: float = 5):
+    """Sample this worker's event loop for a few seconds and return collapsed stacks for a flamegraph."""
+    require_profiling()
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    stacks = await profile_event_loop(seconds, max(interval_ms, 1) / 1000)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(
+        stacks, headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.folded"'}
+    )
+
+def load_prompt_library(path):
+    """Map the prompt library at path, or return None if there isn't a valid one."""
+    if not os.path.exists(path):
+        return None
+    try:
+        library = PromptLibrary(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring prompt library %s: %s", path, e)
+        return None
+    logger.info("Mapped %d prompts from %s", len(library.names()), path)
+    return library
+
+prompt_library = load_prompt_library(PROMPT_LIBRARY)
+# Prompt players of the calls streaming through this worker, by CallSid
+live_calls = {}
+
+@app.get('/prompts', response_class=JSONResponse)
+async def list_prompts():
+    """List the clips in the prompt library with their durations."""
+    if prompt_library is None:
+        return {}
+    return {name: prompt_library.duration_ms(name) for name in prompt_library.names()}
+
+@app.post('/calls/{call_sid}/play', response_class=JSONResponse)
+async def play_prompt_into_call(call_sid: str, prompt: str):
+    """Stream a prompt library clip into a live call on this worker without involving OpenAI."""
+    if prompt_library is None or prompt not in prompt_library:
+        raise HTTPException(status_code=404, detail=f"Unknown prompt {prompt}")
+    play_prompt = live_calls.get(call_sid)
+    if play_prompt is None:
+        raise HTTPException(status_code=404, detail="Call is not streaming through this worker")
+    duration_ms = await play_prompt(prompt)
+    return {"call_sid": call_sid, "prompt": prompt, "duration_ms": duration_ms}
+
+@app.get('/tools', response_class=JSONResponse)
+async def tool_stats():
+    """Report registered tools, call counts, cache hits, timeouts and errors."""
+    return {"enabled": TOOLS, **tool_registry.stats()}
+
+@app.get('/session-profiles', response_class=JSONResponse)
+async def session_profile_stats():
+    """Report loaded session profiles, number assignments and reload counts."""
+    return {"path": SESSION_PROFILES, **session_profiles.stats()}
+
+@app.post('/session-profiles/reload', response_class=JSONResponse)
+async def reload_session_profiles():
+    """Reload the session profile file now instead of waiting for the next poll."""
+    if not await asyncio.to_thread(session_profiles.load, True):
+        raise HTTPException(status_code=422, detail="Session profiles were not reloaded; see the server log")
+    if GREETING_CACHE:
+        asyncio.create_task(warm_greeting())
+    return {"path": SESSION_PROFILES, **session_profiles.stats()}
+
+def require_transcript_access(request):
+    if not (TRANSCRIPTS and TRANSCRIPT_API_TOKEN):
+        raise HTTPException(status_code=404, detail="Transcripts are disabled; set TRANSCRIPTS=true and TRANSCRIPT_API_TOKEN")
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), TRANSCRIPT_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid bearer token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get('/calls/{call_sid}/transcript', response_class=JSONResponse)
+async def get_transcript(call_sid: str, request: Request):
+    """Return a call's transcribed turns, caller and assistant, in order."""
+    require_transcript_access(request)
+    return {"call_sid": call_sid, "turns": await transcript_store.transcript(call_sid)}
+
+@app.get('/session-pool', response_class=JSONResponse)
+async def session_pool_stats():
+    """Report pre-warmed session pool size, hit/miss counts and refill latency."""
+    return {**session_pool.stats(), "speculative": speculative_sessions.stats()}
+
+async def load_allowed_numbers():
+    """Fetch every incoming number and verified caller ID on the account."""
+    incoming_numbers, outgoing_caller_ids = await asyncio.gather(
+        twilio_rest.run(lambda client: [record.phone_number for record in client.incoming_phone_numbers.list()]),
+        twilio_rest.run(lambda client: [record.phone_number for record in client.outgoing_caller_ids.list()]),
+    )
+    return [*incoming_numbers, *outgoing_caller_ids]
+
+async def lookup_number_allowed(to):
+    """Ask Twilio whether one number is an incoming number or verified caller ID."""
+    # Both lookups run concurrently; either match allows the call
+    incoming_numbers, outgoing_caller_ids = await asyncio.gather(
+        twilio_rest.run(lambda client: client.incoming_phone_numbers.list(phone_number=to, limit=1)),
+        twilio_rest.run(lambda client: client.outgoing_caller_ids.list(phone_number=to, limit=1)),
+    )
+    return bool(incoming_numbers or outgoing_caller_ids)
+
+allow_list = AllowList(
+    load_allowed_numbers, lookup_number_allowed, ttl=ALLOW_LIST_TTL, negative_ttl=ALLOW_LIST_NEGATIVE_TTL
+)
+REGISTRY.gauge('bridge_allow_list_numbers', "Outbound numbers in the cached allow-list", fn=lambda: len(allow_list.numbers))
+for stat, description in [
+    ('hits', "Outbound number checks answered from the allow-list"),
+    ('negative_hits', "Outbound number checks refused from the negative cache"),
+    ('misses', "Outbound number checks that asked Twilio"),
+    ('refresh_failures', "Failed bulk loads of the allow-list"),
+]:
+    REGISTRY.counter(f'bridge_allow_list_{stat}_total', description, fn=lambda stat=stat: allow_list.stats()[stat])
+
+@app.get('/allow-list', response_class=JSONResponse)
+async def allow_list_stats():
+    """Report cached allow-list size, age and hit/miss counts."""
+    return allow_list.stats()
+
+@app.post('/allow-list/invalidate', response_class=JSONResponse)
+async def invalidate_allow_list(number: str = None):
+    """Drop the cached answer for ?number=..., or reload the whole allow-list from Twilio."""
+    allow_list.invalidate(number)
+    return allow_list.stats()
 
 async def check_number_allowed(to):
     """Check if a number is allowed to be called."""
@@ -259,21 +1179,16 @@ async def check_number_allowed(to):
         # if to in OVERRIDE_NUMBERS:             
           # return True
 
-        incoming_numbers = client.incoming_phone_numbers.list(phone_number=to)
-        if incoming_numbers:
-            return True
-
-        outgoing_caller_ids = client.outgoing_caller_ids.list(phone_number=to)
-        if outgoing_caller_ids:
-            return True
-
-        return False
+        return await allow_list.allowed(to)
+    except AllowListUnavailable:
+        # Not a refusal: the caller decides whether to try again later
+        raise
     except Exception as e:
-        print(f"Error checking phone number: {e}")
+        logger.error("Error checking phone number: %r", e)
         return False
 
-async def make_call(phone_number_to_call: str):
-    """Make an outbound call."""
+async def make_call(phone_number_to_call: str, speculate: bool = True, profile: str = None):
+    """Make an outbound call and return its CallSid; profile defaults to the one assigned to the number."""
     if not phone_number_to_call:
         raise ValueError("Please provide a phone number to call.")
 
@@ -287,7 +1202,11 @@ async def make_call(phone_number_to_call: str):
 
     # Make sure the WebSocket URL is correctly formatted
     websocket_url = f"wss://{DOMAIN}/media-stream"
-    print(f"Setting up call with WebSocket URL: {websocket_url}")
+    logger.info("Setting up call with WebSocket URL: %s", websocket_url)
+
+    # The profile rides along as a custom parameter on the stream's start event
+    profile = profile or session_profiles.for_number(phone_number_to_call)
+    stream_parameters = f'<Parameter name="profile" value={quoteattr(profile)} />' if profile else ''
 
     outbound_twiml = (
         f'<?xml version="1.0" encoding="UTF-8"?>'
@@ -295,26 +1214,105 @@ async def make_call(phone_number_to_call: str):
         f'<Say>Hello! You are about to start a conversation with an AI assistant.</Say>'
         f'<Pause length="1"/>'
         f'<Connect timeout="20">'
-        f'<Stream url="{websocket_url}" />'
+        f'<Stream url="{websocket_url}">{stream_parameters}</Stream>'
         f'</Connect>'
         f'<Say>I\'m sorry, but we couldn\'t establish a connection. Please try again later.</Say>'
         f'</Response>'
     )
     
-    print(f"Generated TwiML: {outbound_twiml}")
+    logger.debug("Generated TwiML: %s", outbound_twiml)
 
-    call = client.calls.create(
+    call = await twilio_rest.run(lambda client: client.calls.create(
         from_=TWILIO_PHONE_NUMBER,
         to=phone_number_to_call,
         twiml=outbound_twiml
-    )
+    ))
 
-    print(f"Call initiated with SID: {call.sid}")
+    logger.info("Call initiated with SID: %s", call.sid)
+    if speculate:
+        start_speculative_session(call.sid, profile)
     await log_call_sid(call.sid)
+    return call.sid
 
 async def log_call_sid(call_sid):
     """Log the call SID."""
-    print(f"Call started with SID: {call_sid}")
+    logger.info("Call started with SID: %s", call_sid)
+
+async def find_outbound_call(to, since):
+    """Return the CallSid of a call placed to a number since a UTC datetime, or None."""
+    def recent_calls(client):
+        # Calls still queued have no start time yet, so the StartTime filter alone would miss them
+        return [
+            *client.calls.list(to=to, start_time_after=since, limit=20),
+            *client.calls.list(to=to, status='queued', limit=20),
+        ]
+    # Allow for clock skew between this host and Twilio
+    cutoff = since - timedelta(minutes=1)
+    for call in await twilio_rest.run(recent_calls):
+        if call.from_ == TWILIO_PHONE_NUMBER and call.date_created and call.date_created >= cutoff:
+            return call.sid
+    return None
+
+campaign_dialer = CampaignDialer(
+    make_call, lambda: ACTIVE_CALLS.value, calls_per_second=CAMPAIGN_CALLS_PER_SECOND,
+    max_concurrency=CAMPAIGN_MAX_CONCURRENCY, retries=CAMPAIGN_RETRIES, backoff=CAMPAIGN_RETRY_BACKOFF,
+    ring_timeout=CAMPAIGN_RING_TIMEOUT, find_call=find_outbound_call, retention=CAMPAIGN_RETENTION,
+)
+REGISTRY.gauge('bridge_campaign_queued', "Campaign numbers waiting to be dialed", fn=lambda: campaign_dialer.queue.qsize())
+REGISTRY.gauge(
+    'bridge_campaign_unconfirmed', "Campaign numbers whose last dial may have gone through, checked before redialing",
+    fn=lambda: len(campaign_dialer.unconfirmed)
+)
+REGISTRY.gauge('bridge_campaign_ringing', "Campaign calls placed whose media stream has not connected", fn=lambda: len(campaign_dialer.ringing))
+for stat, description in [
+    ('placed', "Campaign calls accepted by Twilio"),
+    ('failures', "Campaign numbers that failed permanently or ran out of retries"),
+    ('retried', "Campaign dials retried after a failure"),
+]:
+    REGISTRY.counter(f'bridge_campaign_{stat}_total', description, fn=lambda stat=stat: campaign_dialer.stats()[stat])
+
+@app.post('/campaigns', response_class=JSONResponse)
+async def create_campaign(request: Request):
+    """Queue a JSON list or CSV of numbers for rate-limited dialing."""
+    if not CAMPAIGNS_ENABLED:
+        raise HTTPException(
+            status_code=409, detail=f"Campaigns need a single worker; this server runs {SERVE_WORKERS}"
+        )
+    try:
+        numbers = parse_numbers(await request.body(), request.headers.get('content-type', ''))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse numbers: {e}")
+    if not numbers:
+        raise HTTPException(status_code=400, detail="No phone numbers found")
+    return campaign_dialer.submit(numbers).progress()
+
+@app.get('/campaigns', response_class=JSONResponse)
+async def list_campaigns():
+    """Report dialer counters and a progress summary of every campaign."""
+    campaign_dialer.prune()
+    return {
+        **campaign_dialer.stats(),
+        "campaigns": [campaign.progress() for campaign in campaign_dialer.campaigns.values()],
+    }
+
+def get_campaign(campaign_id):
+    campaign_dialer.prune()
+    campaign = campaign_dialer.campaigns.get(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Unknown campaign")
+    return campaign
+
+@app.get('/campaigns/{campaign_id}', response_class=JSONResponse)
+async def campaign_progress(campaign_id: str):
+    """Report a campaign's status counts and per-number attempts, CallSids and errors."""
+    return get_campaign(campaign_id).progress(detail=True)
+
+@app.post('/campaigns/{campaign_id}/cancel', response_class=JSONResponse)
+async def cancel_campaign(campaign_id: str):
+    """Stop dialing a campaign's remaining numbers."""
+    campaign = get_campaign(campaign_id)
+    campaign_dialer.cancel(campaign)
+    return campaign.progress()
 
 @app.post("/web-make-call")
 async def web_make_call(to: str = Form(...)):
@@ -581,6 +1579,23 @@ async def test_websocket_page():
 @app.api_route("/incoming-call", methods=["GET", "POST"])
 async def handle_incoming_call(request: Request):
     """Handle incoming call and return TwiML response to connect to Media Stream."""
+    # Twilio sends call details as form fields on POST and query parameters on GET
+    params = request.query_params
+    if request.method == 'POST':
+        params = {**(await request.form()), **params}
+    call_sid = params.get('CallSid')
+    # An explicit ?profile= on the webhook URL wins over the dialed number's profile
+    profile = params.get('profile') or session_profiles.for_number(params.get('To'))
+
+    shed_reason = admission.admit_incoming(call_sid)
+    if shed_reason:
+        logger.warning("Shedding incoming call %s (%s)", call_sid, shed_reason)
+        response = VoiceResponse()
+        response.say(BUSY_MESSAGE)
+        response.hangup()
+        return HTMLResponse(content=str(response), media_type="application/xml")
+    start_speculative_session(call_sid, profile)
+
     response = VoiceResponse()
     # <Say> punctuation to improve text-to-speech flow
     response.say("Please wait while we connect your call to the AI")
@@ -588,7 +1603,13 @@ async def handle_incoming_call(request: Request):
     response.say("O.K. you can start talking!")
     host = request.url.hostname
     connect = Connect()
-    connect.stream(url=f'wss://{DOMAIN}/media-stream')
+    stream = connect.stream(url=f'wss://{DOMAIN}/media-stream')
+    # Whichever worker the stream lands on must not shed a call this one admitted; the token proves it did
+    token = admission.token(call_sid)
+    if token:
+        stream.parameter(name='admitted', value=token)
+    if profile:
+        stream.parameter(name='profile', value=profile)
     response.append(connect)
     return HTMLResponse(content=str(response), media_type="application/xml")
 
@@ -612,6 +1633,8 @@ if __name__ == "__main__":
             'Check with your counsel for legal and compliance advice.'
         )
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(make_call(phone_number))
+        # The server is not running yet, so there is no loop to prepare a session on
+        loop.run_until_complete(make_call(phone_number, speculate=False))
     
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    # For several worker processes run `python serve.py --workers N` instead
+    run_server(app, port=PORT)
@@ -0,0 +1,70 @@
+import os
+import asyncio
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+class GreetingCache:
+    """Greeting audio rendered once per (voice, text, audio format) and kept on disk.
+
+    render is a coroutine function (voice, text, audio_format) -> bytes that
+    has the model speak text. Its output is written to directory so later
+    processes and restarts load it instead of paying model latency and
+    tokens again; get() never renders, so callers on the media path fall
+    back to a live greeting until ensure() has finished.
+    """
+
+    def __init__(self, directory, render):
+        self.directory = directory
+        self.render = render
+        self.audio = {}
+        self.rendering = {}
+
+    def path(self, voice, text, audio_format):
+        digest = hashlib.sha256(f"{voice}\0{audio_format}\0{text}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"greeting-{voice}-{digest}.{audio_format}")
+
+    def get(self, voice, text, audio_format):
+        """Return the cached audio, loading it from disk if needed, or None."""
+        key = (voice, text, audio_format)
+        audio = self.audio.get(key)
+        if audio is None:
+            try:
+                with open(self.path(*key), 'rb') as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                return None
+            if audio:
+                self.audio[key] = audio
+        return audio or None
+
+    async def ensure(self, voice, text, audio_format):
+        """Return the cached audio, rendering and persisting it first if it is missing."""
+        audio = self.get(voice, text, audio_format)
+        if audio is not None:
+            return audio
+        key = (voice, text, audio_format)
+        task = self.rendering.get(key)
+        if task is None:
+            task = self.rendering[key] = asyncio.create_task(self._render(key))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self.rendering.pop(key, None)
+
+    async def _render(self, key):
+        audio = await self.render(*key)
+        if not audio:
+            raise ValueError("Greeting render produced no audio")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(*key)
+        # Write then rename so a concurrent reader never sees a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(audio)
+        os.replace(temporary, path)
+        self.audio[key] = audio
+        logger.info("Cached %d-byte greeting for voice %s at %s", len(audio), key[0], path)
+        return audio
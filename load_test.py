@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import subprocess
+import websockets
+from twilio_media import FRAME_MS, FRAME_BYTES
+
+# One 20 ms frame of caller speech (non-silent μ-law) and of silence, pre-encoded once
+SPEECH_PAYLOAD = base64.b64encode(bytes((i * 53) % 0x7E for i in range(FRAME_BYTES))).decode('ascii')
+SILENCE_PAYLOAD = base64.b64encode(b'\xff' * FRAME_BYTES).decode('ascii')
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values, or None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def process_tree(pid):
+    """pid and all of its descendants, read from /proc."""
+    pids = [pid]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids.extend(process_tree(int(child)))
+        except OSError:
+            pass
+    return pids
+
+def resource_usage(pid):
+    """Return (cpu_seconds, rss_bytes) summed over pid's process tree, or None off Linux."""
+    if not os.path.exists(f"/proc/{pid}"):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    page = os.sysconf('SC_PAGE_SIZE')
+    cpu = rss = 0
+    for proc in process_tree(pid):
+        try:
+            with open(f"/proc/{proc}/stat") as f:
+                # Fields after the parenthesized command name; utime and stime are fields 14 and 15
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f"/proc/{proc}/statm") as f:
+                resident = int(f.read().split()[1])
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+        rss += resident * page
+    return cpu, rss
+
+class FakeTwilioCall:
+    """One simulated Twilio Media Stream: talks in turns, plays back audio and acknowledges marks.
+
+    The caller speaks for talk_ms, then listens for listen_ms, sending a
+    20 ms frame in real time throughout. Marks are echoed when the audio sent
+    before them would have finished playing, as Twilio does, and a clear
+    acknowledges every pending mark at once.
+    """
+
+    def __init__(self, url, index, talk_ms, listen_ms, duration):
+        self.url = url
+        self.call_sid = f"CA{index:032d}"
+        self.stream_sid = f"MZ{index:032d}"
+        self.talk_ms = talk_ms
+        self.listen_ms = listen_ms
+        self.duration = duration
+        self.playout_end = 0.0
+        self.pending_marks = []
+        self.speech_ended_at = None
+        self.cleared = False
+        self.last_media = None
+        self.last_interval = None
+        self.voice_to_voice = []
+        self.jitter = []
+        self.media_frames = 0
+        self.error = None
+
+    async def run(self):
+        try:
+            async with websockets.connect(self.url, max_size=None) as twilio_ws:
+                await twilio_ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+                await twilio_ws.send(json.dumps({
+                    "event": "start", "sequenceNumber": "1", "streamSid": self.stream_sid,
+                    "start": {"streamSid": self.stream_sid, "callSid": self.call_sid, "tracks": ["inbound"],
+                              "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1}},
+                }))
+                receiver = asyncio.create_task(self.receive(twilio_ws))
+                try:
+                    await self.talk(twilio_ws)
+                    await twilio_ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid}))
+                finally:
+                    receiver.cancel()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            self.error = repr(e)
+
+    async def talk(self, twilio_ws):
+        cycle = self.talk_ms + self.listen_ms
+        frames = int(self.duration * 1000 / FRAME_MS)
+        started = time.monotonic()
+        speaking = False
+        for i in range(frames):
+            # Sleep to an absolute schedule so frame timing does not drift under load
+            delay = started + i * FRAME_MS / 1000 - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            talking = (i * FRAME_MS) % cycle < self.talk_ms
+            if talking and not speaking:
+                self.speech_ended_at = None
+                self.cleared = False
+            elif speaking and not talking:
+                self.speech_ended_at = time.monotonic()
+            speaking = talking
+            payload = SPEECH_PAYLOAD if talking else SILENCE_PAYLOAD
+            await twilio_ws.send(
+                '{"event":"media","streamSid":"' + self.stream_sid + '","media":{"track":"inbound","chunk":"'
+                + str(i) + '","timestamp":"' + str(i * FRAME_MS) + '","payload":"' + payload + '"}}'
+            )
+
+    async def receive(self, twilio_ws):
+        async for message in twilio_ws:
+            data = json.loads(message)
+            event = data.get('event')
+            now = time.monotonic()
+            if event == 'media':
+                self.media(now, len(base64.b64decode(data['media']['payload'])))
+            elif event == 'mark':
+                name = data['mark']['name']
+                self.pending_marks.append(name)
+                asyncio.get_running_loop().call_later(
+                    max(0.0, self.playout_end - now), self.ack_mark, twilio_ws, name
+                )
+            elif event == 'clear':
+                self.cleared = True
+                self.playout_end = now
+                self.last_media = None
+                for name in list(self.pending_marks):
+                    self.ack_mark(twilio_ws, name)
+
+    def media(self, now, size):
+        self.media_frames += 1
+        # Only audio after a clear during the last turn belongs to the reply to that turn
+        if self.speech_ended_at is not None and self.cleared:
+            self.voice_to_voice.append(now - self.speech_ended_at)
+            self.speech_ended_at = None
+        if self.last_media is not None and now - self.last_media < 0.5:
+            interval = now - self.last_media
+            if self.last_interval is not None:
+                self.jitter.append(abs(interval - self.last_interval))
+            self.last_interval = interval
+        else:
+            self.last_interval = None  # First frame of a reply; the gap before it is not jitter
+        self.last_media = now
+        self.playout_end = max(self.playout_end, now) + size / (FRAME_BYTES / FRAME_MS) / 1000
+
+    def ack_mark(self, twilio_ws, name):
+        if name not in self.pending_marks:
+            return
+        self.pending_marks.remove(name)
+        message = json.dumps({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}})
+        asyncio.ensure_future(self.send_quietly(twilio_ws, message))
+
+    async def send_quietly(self, twilio_ws, message):
+        try:
+            await twilio_ws.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+async def run_load(args, server_pid=None, quiet=False):
+    """Start args.calls calls, ramped over args.ramp seconds, and report latency, jitter and server cost.
+
+    Returns a summary dict; quiet skips printing it.
+    """
+    url = f"ws://{args.host}:{args.port}/media-stream"
+    calls = [FakeTwilioCall(url, i, args.talk_ms, args.listen_ms, args.duration) for i in range(args.calls)]
+
+    async def start(call, delay):
+        await asyncio.sleep(delay)
+        await call.run()
+
+    before = resource_usage(server_pid) if server_pid else None
+    started = time.monotonic()
+    peak_rss = before[1] if before else 0
+    tasks = [asyncio.create_task(start(call, args.ramp * i / max(1, args.calls))) for i, call in enumerate(calls)]
+    pending = set(tasks)
+    while pending:
+        _, pending = await asyncio.wait(pending, timeout=1)
+        if before:
+            usage = resource_usage(server_pid)
+            if usage:
+                peak_rss = max(peak_rss, usage[1])
+    wall = time.monotonic() - started
+    after = resource_usage(server_pid) if server_pid else None
+
+    failed = [call for call in calls if call.error]
+    voice_to_voice = [v for call in calls for v in call.voice_to_voice]
+    jitter = [j for call in calls for j in call.jitter]
+    cpu = after[0] - before[0] if before and after else None
+    summary = {
+        "calls": args.calls, "failed": len(failed), "wall": wall, "voice_to_voice": voice_to_voice,
+        "jitter": jitter, "server_cpu": cpu, "server_peak_rss": peak_rss if after else None,
+    }
+    if quiet:
+        return summary
+    print(f"calls: {args.calls} ({len(failed)} failed), duration {args.duration:.0f} s, wall {wall:.1f} s")
+    for call in failed[:5]:
+        print(f"  {call.call_sid}: {call.error}")
+    print(f"media frames received: {sum(call.media_frames for call in calls)}")
+    print(f"{'':<22} {'n':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in (("voice-to-voice", voice_to_voice), ("outbound jitter", jitter)):
+        row = [percentile(values, p) for p in (0.5, 0.95, 0.99)] + [max(values, default=None)]
+        print(f"{name:<22} {len(values):>7} " + " ".join(
+            f"{v * 1000:>8.1f}" if v is not None else f"{'-':>8}" for v in row
+        ))
+    if cpu is not None:
+        call_seconds = args.calls * args.duration
+        print(f"server CPU: {cpu:.2f} s ({cpu / wall * 100:.0f}% of one core, "
+              f"{cpu / call_seconds * 1000:.2f} ms per call-second)")
+        print(f"server RSS: {before[1] / 2**20:.1f} MB idle, {peak_rss / 2**20:.1f} MB peak, "
+              f"{(peak_rss - before[1]) / max(1, args.calls) / 2**10:.0f} KB per call")
+    elif server_pid:
+        print("server CPU/RSS: not available on this platform")
+    return summary
+
+async def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Nothing listening on {host}:{port} after {timeout} s")
+
+def spawn(args):
+    """Start the mock Realtime API and a bridge pointed at it; return both processes."""
+    mock = subprocess.Popen([
+        sys.executable, "mock_realtime_server.py", "--port", str(args.mock_port),
+        "--response-ms", str(args.response_ms), "--first-audio-delay-ms", str(args.first_audio_delay_ms),
+    ])
+    env = {
+        **os.environ,
+        "OPENAI_REALTIME_URL": f"ws://127.0.0.1:{args.mock_port}",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "sk-load-test",
+        "TWILIO_ACCOUNT_SID": os.getenv("TWILIO_ACCOUNT_SID") or "AC" + "0" * 32,
+        "TWILIO_AUTH_TOKEN": os.getenv("TWILIO_AUTH_TOKEN") or "load-test",
+        "TWILIO_PHONE_NUMBER": os.getenv("TWILIO_PHONE_NUMBER") or "+15550000000",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL") or "WARNING",
+    }
+    bridge = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(args.workers), "--host", args.host, "--port", str(args.port)],
+        env=env,
+    )
+    return mock, bridge
+
+async def main(args):
+    processes = spawn(args) if args.spawn else ()
+    try:
+        await wait_for_port(args.host, args.port)
+        server_pid = processes[1].pid if processes else args.server_pid
+        await run_load(args, server_pid)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent fake Twilio media streams through the bridge and report latency and cost."
+    )
+    parser.add_argument('--calls', type=int, default=50, help="Concurrent calls to simulate")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds each call lasts")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Seconds over which calls are started")
+    parser.add_argument('--talk-ms', type=int, default=1500, help="Length of each caller utterance")
+    parser.add_argument('--listen-ms', type=int, default=3500, help="Silence after each utterance")
+    parser.add_argument('--host', default="127.0.0.1", help="Bridge host")
+    parser.add_argument('--port', type=int, default=5050, help="Bridge port")
+    parser.add_argument('--server-pid', type=int, help="Bridge process to sample CPU and RSS from")
+    parser.add_argument('--spawn', action='store_true',
+                        help="Start mock_realtime_server.py and serve.py locally instead of using a running bridge")
+    parser.add_argument('--workers', type=int, default=1, help="Bridge worker processes when spawning")
+    parser.add_argument('--mock-port', type=int, default=8765, help="Mock Realtime API port when spawning")
+    parser.add_argument('--response-ms', type=int, default=2000, help="Mock reply length when spawning")
+    parser.add_argument('--first-audio-delay-ms', type=int, default=300, help="Mock model latency when spawning")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+import math
+from audio_dsp import NUMPY_AVAILABLE, ulaw_decode, level_db, zero_crossing_rate
+
+# The detector decodes audio with numpy, which is optional
+VAD_AVAILABLE = NUMPY_AVAILABLE
+
+class LocalVAD:
+    """Energy and zero-crossing-rate speech detector over decoded μ-law frames.
+
+    A frame counts as speech when its level is at least threshold_db dBFS
+    and margin_db above the tracked noise floor, and its zero-crossing rate
+    is at most max_zcr (hiss and line noise cross zero far more often than
+    voiced speech). Speech starts after start_ms of speech frames in a row
+    and stops after stop_ms without one. frame() returns 'speech_started',
+    'speech_stopped' or None.
+    """
+
+    def __init__(self, threshold_db=-40.0, margin_db=12.0, max_zcr=0.35, start_ms=60, stop_ms=400, frame_ms=20):
+        if not VAD_AVAILABLE:
+            raise RuntimeError("The local VAD needs numpy")
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.max_zcr = max_zcr
+        self.start_frames = max(1, math.ceil(start_ms / frame_ms))
+        self.stop_frames = max(1, math.ceil(stop_ms / frame_ms))
+        self.noise_floor_db = threshold_db - margin_db
+        self.speaking = False
+        self.run = 0  # Consecutive frames disagreeing with the current state
+        self.frames = 0
+        self.speech_frames = 0
+
+    def is_speech(self, ulaw):
+        samples = ulaw_decode(ulaw)
+        if samples.size == 0:
+            return False
+        level = level_db(samples)
+        zcr = zero_crossing_rate(samples)
+        speech = level >= max(self.threshold_db, self.noise_floor_db + self.margin_db) and zcr <= self.max_zcr
+        if not speech:
+            # Follow the floor down quickly and up slowly so speech does not raise it
+            rate = 0.3 if level < self.noise_floor_db else 0.02
+            self.noise_floor_db += rate * (level - self.noise_floor_db)
+        return speech
+
+    def frame(self, ulaw):
+        """Feed one frame of μ-law audio and return the state change it caused, if any."""
+        self.frames += 1
+        speech = self.is_speech(ulaw)
+        self.speech_frames += speech
+        if speech == self.speaking:
+            self.run = 0
+            return None
+        self.run += 1
+        if self.speaking and self.run >= self.stop_frames:
+            self.speaking = False
+            self.run = 0
+            return 'speech_stopped'
+        if not self.speaking and self.run >= self.start_frames:
+            self.speaking = True
+            self.run = 0
+            return 'speech_started'
+        return None
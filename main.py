@@ -3,17 +3,24 @@ import json
 import base64
 import asyncio
 import argparse
-from fastapi import FastAPI, WebSocket, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.websockets import WebSocketDisconnect
-from twilio.rest import Client
+from twilio_rest import TwilioRest
 import websockets
 from dotenv import load_dotenv, dotenv_values
 import uvicorn
 import re
+import logging
+from async_logging import setup_logging, bind_call
+from transcripts import TranscriptAssembler, TranscriptStore, TRANSCRIPT_EVENT_TYPES
 
 load_dotenv()
 
+setup_logging(os.getenv('LOG_LEVEL', 'INFO').upper(), int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+logger = logging.getLogger(__name__)
+
 # Configuration
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -21,7 +28,7 @@ TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 env_config = dotenv_values(".env")
 DOMAIN = env_config['DOMAIN']
-print(f"Domain: {DOMAIN}")
+logger.info("Domain: %s", DOMAIN)
 
 PORT = int(os.getenv('PORT', 6060))
 SYSTEM_MESSAGE = (
@@ -36,14 +43,25 @@ LOG_EVENT_TYPES = [
     'input_audio_buffer.committed', 'input_audio_buffer.speech_stopped',
     'input_audio_buffer.speech_started', 'session.created'
 ]
+# Transcribe both sides of every call and keep the turns in TRANSCRIPT_DB (SQLite, written in batches)
+TRANSCRIPTS = os.getenv('TRANSCRIPTS', 'false').lower() == 'true'
+TRANSCRIPT_DB = os.getenv('TRANSCRIPT_DB', 'transcripts.db')
+TRANSCRIPTION_MODEL = os.getenv('TRANSCRIPTION_MODEL', 'whisper-1')
+
+transcript_store = TranscriptStore(TRANSCRIPT_DB)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await transcript_store.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER and OPENAI_API_KEY):
     raise ValueError('Missing Twilio and/or OpenAI environment variables. Please set them in the .env file.')
 
-# Initialize Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Twilio REST client; requests run on a thread pool so they never block the event loop
+twilio_rest = TwilioRest(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 @app.get('/', response_class=JSONResponse)
 async def index_page():
@@ -52,7 +70,7 @@ async def index_page():
 @app.websocket('/media-stream')
 async def handle_media_stream(websocket: WebSocket):
     """Handle WebSocket connections between Twilio and OpenAI."""
-    print("Client connected")
+    logger.info("Client connected")
     await websocket.accept()
 
     url = 'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
@@ -65,10 +83,11 @@ async def handle_media_stream(websocket: WebSocket):
     ) as openai_ws:
         await initialize_session(openai_ws)
         stream_sid = None
+        transcript = None
 
         async def receive_from_twilio():
             """Receive audio data from Twilio and send it to the OpenAI Realtime API."""
-            nonlocal stream_sid
+            nonlocal stream_sid, transcript
             try:
                 async for message in websocket.iter_text():
                     data = json.loads(message)
@@ -81,13 +100,16 @@ async def handle_media_stream(websocket: WebSocket):
                             }
                             await openai_ws.send(json.dumps(audio_append))
                         except websockets.exceptions.ConnectionClosed:
-                            print("OpenAI WebSocket connection is closed")
+                            logger.warning("OpenAI WebSocket connection is closed")
                             break
                     elif data['event'] == 'start':
                         stream_sid = data['start']['streamSid']
-                        print(f"Incoming stream has started {stream_sid}")
+                        bind_call(stream_sid, data['start'].get('callSid'))
+                        if TRANSCRIPTS:
+                            transcript = TranscriptAssembler(data['start'].get('callSid') or stream_sid, transcript_store.add)
+                        logger.info("Incoming stream has started %s", stream_sid)
             except WebSocketDisconnect:
-                print("Client disconnected.")
+                logger.info("Client disconnected.")
                 try:
                     await openai_ws.close()
                 except:
@@ -100,9 +122,11 @@ async def handle_media_stream(websocket: WebSocket):
                 async for openai_message in openai_ws:
                     response = json.loads(openai_message)
                     if response['type'] in LOG_EVENT_TYPES:
-                        print(f"Received event: {response['type']}", response)
+                        logger.info("Received event: %s %s", response['type'], response)
                     if response['type'] == 'session.updated':
-                        print("Session updated successfully:", response)
+                        logger.debug("Session updated successfully: %s", response)
+                    if transcript and response['type'] in TRANSCRIPT_EVENT_TYPES:
+                        transcript.handle(response)
                     if response['type'] == 'response.audio.delta' and response.get('delta'):
                         try:
                             audio_payload = base64.b64encode(base64.b64decode(response['delta'])).decode('utf-8')
@@ -115,10 +139,19 @@ async def handle_media_stream(websocket: WebSocket):
                             }
                             await websocket.send_json(audio_delta)
                         except Exception as e:
-                            print(f"Error processing audio data: {e}")
+                            logger.error("Error processing audio data: %s", e)
             except Exception as e:
-                print(f"Error in send_to_twilio: {e}")
+                logger.error("Error in send_to_twilio: %s", e)
         await asyncio.gather(receive_from_twilio(), send_to_twilio())
+        if transcript:
+            transcript.close()
+
+@app.get('/calls/{call_sid}/transcript', response_class=JSONResponse)
+async def get_transcript(call_sid: str):
+    """Return a call's transcribed turns, caller and assistant, in order."""
+    if not TRANSCRIPTS:
+        raise HTTPException(status_code=404, detail="Transcripts are disabled")
+    return {"call_sid": call_sid, "turns": await transcript_store.transcript(call_sid)}
 
 async def send_initial_conversation_item(openai_ws):
     """Send initial conversation so AI talks first."""
@@ -156,7 +189,9 @@ async def initialize_session(openai_ws):
             "temperature": 0.8,
         }
     }
-    print('Sending session update:', json.dumps(session_update))
+    if TRANSCRIPTS:
+        session_update["session"]["input_audio_transcription"] = {"model": TRANSCRIPTION_MODEL}
+    logger.debug('Sending session update: %s', session_update)
     await openai_ws.send(json.dumps(session_update))
 
     # Have the AI speak first
@@ -170,17 +205,14 @@ async def check_number_allowed(to):
         # if to in OVERRIDE_NUMBERS:             
           # return True
 
-        incoming_numbers = client.incoming_phone_numbers.list(phone_number=to)
-        if incoming_numbers:
-            return True
-
-        outgoing_caller_ids = client.outgoing_caller_ids.list(phone_number=to)
-        if outgoing_caller_ids:
-            return True
-
-        return False
+        # Both lookups run concurrently; either match allows the call
+        incoming_numbers, outgoing_caller_ids = await asyncio.gather(
+            twilio_rest.run(lambda client: client.incoming_phone_numbers.list(phone_number=to, limit=1)),
+            twilio_rest.run(lambda client: client.outgoing_caller_ids.list(phone_number=to, limit=1)),
+        )
+        return bool(incoming_numbers or outgoing_caller_ids)
     except Exception as e:
-        print(f"Error checking phone number: {e}")
+        logger.error("Error checking phone number: %r", e)
         return False
 
 async def make_call(phone_number_to_call: str):
@@ -201,11 +233,11 @@ async def make_call(phone_number_to_call: str):
         f'<Response><Connect><Stream url="wss://{DOMAIN}/media-stream" /></Connect></Response>'
     )
 
-    call = client.calls.create(
+    call = await twilio_rest.run(lambda client: client.calls.create(
         from_=TWILIO_PHONE_NUMBER,
         to=phone_number_to_call,
         twiml=outbound_twiml
-    )
+    ))
 
     await log_call_sid(call.sid)
 
@@ -213,8 +245,8 @@ async def log_call_sid(call_sid):
     """Log the call SID."""
     # Log the WebSocket URL we are going to access
     websocket_url = f"wss://{DOMAIN}/media-stream"
-    print(f"WebSocket URL for this call: {websocket_url}")
-    print(f"Call started with SID: {call_sid}")
+    logger.info("WebSocket URL for this call: %s", websocket_url)
+    logger.info("Call started with SID: %s", call_sid)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Twilio AI voice assistant server.")
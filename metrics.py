@@ -0,0 +1,264 @@
+import time
+from bisect import bisect_left
+
+# Log-linear bucket bounds in seconds: 4 sub-buckets per doubling from 0.5 ms to ~65 s,
+# so every bucket has the same relative precision like an HDR histogram.
+LATENCY_BUCKETS = tuple(0.0005 * 2 ** (i / 4) for i in range(4 * 17 + 1))
+
+class Counter:
+    """Monotonically increasing value, or one read from fn at scrape time."""
+
+    def __init__(self, name, description, fn=None):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        value = self.fn() if self.fn else self.value
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {value}",
+        ]
+
+class Gauge:
+    """Value that can go up and down, or is read from fn at scrape time."""
+
+    def __init__(self, name, description, fn=None):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def render(self):
+        value = self.fn() if self.fn else self.value
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {0 if value is None else value}",
+        ]
+
+class Histogram:
+    """Fixed-bucket latency histogram exported in Prometheus format."""
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together on /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, fn=None):
+        return self.register(Counter(name, description, fn))
+
+    def gauge(self, name, description, fn=None):
+        return self.register(Gauge(name, description, fn))
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+CALLS_TOTAL = REGISTRY.counter('bridge_calls_total', "Media streams bridged to OpenAI")
+ACTIVE_CALLS = REGISTRY.gauge('bridge_active_calls', "Media streams currently connected to this worker")
+UPSTREAM_CONNECT_SECONDS = REGISTRY.histogram(
+    'bridge_upstream_connect_seconds', "Time to open the OpenAI Realtime WebSocket"
+)
+SESSION_UPDATE_ACK_SECONDS = REGISTRY.histogram(
+    'bridge_session_update_ack_seconds', "Time from sending session.update to receiving session.updated"
+)
+VOICE_TO_VOICE_SECONDS = REGISTRY.histogram(
+    'bridge_voice_to_voice_seconds', "Time from input_audio_buffer.speech_stopped to the first response audio delta"
+)
+INTERRUPT_TO_CLEAR_SECONDS = REGISTRY.histogram(
+    'bridge_interrupt_to_clear_seconds', "Time from input_audio_buffer.speech_started to the Twilio clear being sent"
+)
+INBOUND_JITTER_SECONDS = REGISTRY.histogram(
+    'bridge_inbound_frame_jitter_seconds', "Change in inter-arrival time between consecutive Twilio media frames"
+)
+OUTBOUND_JITTER_SECONDS = REGISTRY.histogram(
+    'bridge_outbound_frame_jitter_seconds', "Change in inter-arrival time between consecutive OpenAI audio deltas"
+)
+OUTBOUND_FRAMES = REGISTRY.counter('bridge_outbound_frames_total', "Paced 20 ms frames sent to Twilio")
+OUTBOUND_UNDERRUNS = REGISTRY.counter(
+    'bridge_outbound_underruns_total', "Times paced playout fell behind real time because OpenAI audio arrived late"
+)
+OUTBOUND_FLUSHED_SECONDS = REGISTRY.counter(
+    'bridge_outbound_flushed_seconds_total', "Queued outbound audio dropped on interruption"
+)
+OUTBOUND_BACKPRESSURE_WAITS = REGISTRY.counter(
+    'bridge_outbound_backpressure_waits_total', "Times the outbound buffer was full and OpenAI reads were paused"
+)
+OUTBOUND_BACKPRESSURE_SECONDS = REGISTRY.counter(
+    'bridge_outbound_backpressure_seconds_total', "Time OpenAI reads were paused by a full outbound buffer"
+)
+LOCAL_VAD_SPEECH_STARTS = REGISTRY.counter(
+    'bridge_local_vad_speech_starts_total', "Caller speech onsets detected by the local VAD"
+)
+LOCAL_VAD_BARGE_INS = REGISTRY.counter(
+    'bridge_local_vad_barge_ins_total', "Assistant audio interrupted by the local VAD before OpenAI reported speech"
+)
+LOCAL_VAD_CONFIRMED = REGISTRY.counter(
+    'bridge_local_vad_confirmed_total', "Local VAD barge-ins followed by input_audio_buffer.speech_started"
+)
+LOCAL_VAD_UNCONFIRMED = REGISTRY.counter(
+    'bridge_local_vad_unconfirmed_total', "Local VAD barge-ins OpenAI never reported as speech (likely false positives)"
+)
+LOCAL_VAD_LEAD_SECONDS = REGISTRY.histogram(
+    'bridge_local_vad_lead_seconds', "How much earlier the local VAD interrupted than input_audio_buffer.speech_started"
+)
+INBOUND_FRAMES_SUPPRESSED = REGISTRY.counter(
+    'bridge_inbound_frames_suppressed_total', "Silent caller frames not forwarded to OpenAI"
+)
+INBOUND_BYTES_SUPPRESSED = REGISTRY.counter(
+    'bridge_inbound_bytes_suppressed_total', "μ-law bytes of silent caller audio not forwarded to OpenAI"
+)
+INBOUND_SUPPRESSIONS = REGISTRY.counter(
+    'bridge_inbound_suppressions_total', "Stretches of caller silence during which forwarding stopped"
+)
+CALLER_SPEECH_LEVEL_DB = REGISTRY.histogram(
+    'bridge_caller_speech_level_dbfs', "Mean level of each call's non-silent caller audio",
+    buckets=tuple(range(-70, 1, 5))
+)
+CALLER_SILENCE_RATIO = REGISTRY.histogram(
+    'bridge_caller_silence_ratio', "Fraction of each call's caller frames below SILENCE_THRESHOLD_DB",
+    buckets=tuple(i / 10 for i in range(1, 11))
+)
+RECORDING_DROPPED_SECONDS = REGISTRY.counter(
+    'bridge_recording_dropped_seconds_total', "Call audio left out of recordings because the disk could not keep up"
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'bridge_event_loop_lag_seconds', "How late the event loop woke a task sleeping on a fixed interval"
+)
+TWILIO_REST_SECONDS = REGISTRY.histogram(
+    'bridge_twilio_rest_seconds', "Time for Twilio REST API requests run on the worker thread pool"
+)
+TWILIO_REST_ERRORS = REGISTRY.counter('bridge_twilio_rest_errors_total', "Twilio REST API requests that raised")
+TWILIO_REST_TIMEOUTS = REGISTRY.counter(
+    'bridge_twilio_rest_timeouts_total', "Twilio REST API requests abandoned after TWILIO_REST_TIMEOUT"
+)
+
+def record_pacer(pacer):
+    """Add a finished call's outbound pacer counters to the totals."""
+    OUTBOUND_FRAMES.inc(pacer.frames_sent)
+    OUTBOUND_UNDERRUNS.inc(pacer.underruns)
+    OUTBOUND_FLUSHED_SECONDS.inc(pacer.flushed_ms / 1000)
+    OUTBOUND_BACKPRESSURE_WAITS.inc(pacer.backpressure_waits)
+    OUTBOUND_BACKPRESSURE_SECONDS.inc(pacer.backpressure_seconds)
+
+def record_suppressor(suppressor):
+    """Add a finished call's silence suppression counters to the totals."""
+    INBOUND_FRAMES_SUPPRESSED.inc(suppressor.frames_suppressed)
+    INBOUND_BYTES_SUPPRESSED.inc(suppressor.bytes_suppressed)
+    INBOUND_SUPPRESSIONS.inc(suppressor.suppressions)
+
+def record_levels(levels):
+    """Add a finished call's caller level statistics to the histograms."""
+    levels.flush()
+    if levels.speech_level_db is not None:
+        CALLER_SPEECH_LEVEL_DB.observe(levels.speech_level_db)
+    if levels.silence_ratio is not None:
+        CALLER_SILENCE_RATIO.observe(levels.silence_ratio)
+
+class FrameJitter:
+    """Track |D(i) - D(i-1)| over frame inter-arrival times, as in RFC 3550."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.last_arrival = None
+        self.last_interval = None
+
+    def reset(self):
+        """Forget the previous frame so gaps between responses are not counted."""
+        self.last_arrival = None
+        self.last_interval = None
+
+    def frame(self, now):
+        if self.last_arrival is not None:
+            interval = now - self.last_arrival
+            if self.last_interval is not None:
+                self.histogram.observe(abs(interval - self.last_interval))
+            self.last_interval = interval
+        self.last_arrival = now
+
+class CallTimer:
+    """Per-call timing recorder feeding the bridge histograms."""
+
+    def __init__(self):
+        self.inbound = FrameJitter(INBOUND_JITTER_SECONDS)
+        self.outbound = FrameJitter(OUTBOUND_JITTER_SECONDS)
+        self.speech_stopped_at = None
+
+    def inbound_frame(self):
+        self.inbound.frame(time.monotonic())
+
+    def outbound_frame(self):
+        now = time.monotonic()
+        self.outbound.frame(now)
+        if self.speech_stopped_at is not None:
+            VOICE_TO_VOICE_SECONDS.observe(now - self.speech_stopped_at)
+            self.speech_stopped_at = None
+
+    def speech_stopped(self):
+        self.speech_stopped_at = time.monotonic()
+        self.outbound.reset()
+
+    def speech_started(self):
+        """Return the start time to pass to cleared()."""
+        # A new utterance invalidates any pending voice-to-voice measurement
+        self.speech_stopped_at = None
+        self.outbound.reset()
+        return time.monotonic()
+
+    def cleared(self, started_at):
+        INTERRUPT_TO_CLEAR_SECONDS.observe(time.monotonic() - started_at)
@@ -0,0 +1,207 @@
+import json
+import base64
+import asyncio
+import argparse
+from array import array
+import logging
+import websockets
+from async_logging import setup_logging
+from twilio_media import ULAW_BYTES_PER_MS
+
+logger = logging.getLogger(__name__)
+
+# μ-law codes for (near) zero amplitude; anything else counts as speech for the mock VAD
+ULAW_SILENCE = (0xFF, 0x7F, 0xFE, 0x7E)
+# 24 kHz PCM16: two bytes per sample; samples quieter than this count as silence
+PCM16_BYTES_PER_MS = 48
+PCM16_SILENCE = 64
+
+def event(event_type, **fields):
+    """Serialize a server event the way OpenAI does: compact, with "type" first."""
+    return json.dumps({"type": event_type, **fields}, separators=(",", ":"))
+
+def is_speech(audio):
+    """Treat a chunk as speech when most of its samples are not silence codes."""
+    silent = sum(audio.count(code) for code in ULAW_SILENCE)
+    return silent < len(audio) / 2
+
+def is_pcm16_speech(audio):
+    """is_speech for PCM16: most samples must be louder than PCM16_SILENCE."""
+    samples = array('h', audio[:len(audio) & ~1])
+    silent = sum(1 for sample in samples if -PCM16_SILENCE < sample < PCM16_SILENCE)
+    return silent < len(samples) / 2
+
+class MockSession:
+    """One scripted Realtime API session.
+
+    Acknowledges session.update, runs a sample-level VAD over appended audio
+    in the session's format, g711_ulaw or pcm16 (speech_started /
+    speech_stopped / committed, then an automatic response like
+    server_vad), and answers response.create with audio deltas of
+    chunk_ms at speed times real time after first_audio_delay_ms.
+    """
+
+    def __init__(self, openai_ws, options):
+        self.openai_ws = openai_ws
+        self.options = options
+        self.session = {}
+        self.response_task = None
+        self.responses = 0
+        self.items = 0
+        self.audio_ms = 0
+        self.speaking = False
+        self.silence_ms = 0
+        chunk_bytes = options.chunk_ms * ULAW_BYTES_PER_MS
+        # A repeating non-silent pattern stands in for synthesized speech
+        self.chunk = base64.b64encode(bytes((i * 37) % 0x7E for i in range(chunk_bytes))).decode('ascii')
+        samples = array('h', (((i * 37) % 200 - 100) * 40 for i in range(options.chunk_ms * PCM16_BYTES_PER_MS // 2)))
+        self.pcm16_chunk = base64.b64encode(samples.tobytes()).decode('ascii')
+
+    @property
+    def pcm16(self):
+        return self.session.get("input_audio_format") == "pcm16"
+
+    async def send(self, event_type, **fields):
+        await self.openai_ws.send(event(event_type, **fields))
+
+    async def run(self):
+        await self.send("session.created", session=self.session)
+        try:
+            async for message in self.openai_ws:
+                await self.handle(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.cancel_response()
+
+    async def handle(self, client_event):
+        event_type = client_event.get("type")
+        if event_type == "session.update":
+            self.session.update(client_event.get("session", {}))
+            await self.send("session.updated", session=self.session)
+        elif event_type == "conversation.item.create":
+            self.items += 1
+            item = {**client_event.get("item", {}), "id": f"item_client_{self.items}"}
+            await self.send("conversation.item.created", item=item)
+        elif event_type == "response.create":
+            self.start_response()
+        elif event_type == "response.cancel":
+            self.cancel_response()
+        elif event_type == "conversation.item.truncate":
+            await self.send(
+                "conversation.item.truncated", item_id=client_event.get("item_id"),
+                content_index=client_event.get("content_index", 0), audio_end_ms=client_event.get("audio_end_ms")
+            )
+        elif event_type == "input_audio_buffer.append":
+            await self.vad(base64.b64decode(client_event.get("audio", "")))
+        elif event_type == "input_audio_buffer.commit":
+            await self.send("input_audio_buffer.committed", item_id=f"item_input_{self.items}")
+
+    async def vad(self, audio):
+        chunk_ms = len(audio) / (PCM16_BYTES_PER_MS if self.pcm16 else ULAW_BYTES_PER_MS)
+        self.audio_ms += chunk_ms
+        if (is_pcm16_speech if self.pcm16 else is_speech)(audio):
+            self.silence_ms = 0
+            if not self.speaking:
+                self.speaking = True
+                await self.send("input_audio_buffer.speech_started", audio_start_ms=int(self.audio_ms - chunk_ms))
+            return
+
+        if not self.speaking:
+            return
+        self.silence_ms += chunk_ms
+        if self.silence_ms >= self.options.vad_silence_ms:
+            self.speaking = False
+            self.items += 1
+            item_id = f"item_input_{self.items}"
+            await self.send("input_audio_buffer.speech_stopped", audio_end_ms=int(self.audio_ms), item_id=item_id)
+            await self.send("input_audio_buffer.committed", item_id=item_id)
+            if self.session.get("input_audio_transcription"):
+                await self.send("conversation.item.input_audio_transcription.completed", item_id=item_id,
+                                content_index=0, transcript=f"Caller turn {self.items}.")
+            if self.options.tool_calls and self.session.get("tools"):
+                # Call the first tool; the client's function_call_output and response.create get the audio reply
+                self.cancel_response()
+                self.response_task = asyncio.create_task(self.call_tool(self.session["tools"][0]["name"]))
+                return
+            self.start_response()
+
+    def start_response(self):
+        self.cancel_response()
+        self.response_task = asyncio.create_task(self.stream_response())
+
+    def cancel_response(self):
+        if self.response_task and not self.response_task.done():
+            self.response_task.cancel()
+
+    async def call_tool(self, name):
+        self.responses += 1
+        response_id = f"resp_{self.responses}"
+        self.items += 1
+        item_id = f"item_{self.items}"
+        call_id = f"call_{self.items}"
+        await self.send("response.created", response={"id": response_id, "status": "in_progress"})
+        await asyncio.sleep(self.options.first_audio_delay_ms / 1000)
+        await self.send("response.output_item.added", response_id=response_id, output_index=0,
+                        item={"id": item_id, "type": "function_call", "call_id": call_id, "name": name})
+        await self.send("response.function_call_arguments.done", response_id=response_id, item_id=item_id,
+                        output_index=0, call_id=call_id, name=name, arguments="{}")
+        await self.send("response.done", response={"id": response_id, "status": "completed"})
+
+    async def stream_response(self):
+        self.responses += 1
+        response_id = f"resp_{self.responses}"
+        self.items += 1
+        item_id = f"item_{self.items}"
+        options = self.options
+        status = "completed"
+        try:
+            await self.send("response.created", response={"id": response_id, "status": "in_progress"})
+            await asyncio.sleep(options.first_audio_delay_ms / 1000)
+            await self.send("response.output_item.added", response_id=response_id, output_index=0,
+                            item={"id": item_id, "type": "message", "role": "assistant"})
+            chunk = self.pcm16_chunk if self.session.get("output_audio_format") == "pcm16" else self.chunk
+            words = []
+            for index in range(max(1, options.response_ms // options.chunk_ms)):
+                await self.send("response.audio.delta", response_id=response_id, item_id=item_id,
+                                output_index=0, content_index=0, delta=chunk)
+                words.append(f"word{index} ")
+                await self.send("response.audio_transcript.delta", response_id=response_id, item_id=item_id,
+                                output_index=0, content_index=0, delta=words[-1])
+                await asyncio.sleep(options.chunk_ms / 1000 / options.speed)
+            await self.send("response.audio_transcript.done", response_id=response_id, item_id=item_id,
+                            output_index=0, content_index=0, transcript="".join(words))
+            await self.send("response.audio.done", response_id=response_id, item_id=item_id,
+                            output_index=0, content_index=0)
+        except asyncio.CancelledError:
+            status = "cancelled"
+        finally:
+            try:
+                await self.send("response.done", response={"id": response_id, "status": status})
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+async def serve(options):
+    async def handle(openai_ws):
+        await MockSession(openai_ws, options).run()
+
+    async with websockets.serve(handle, options.host, options.port, max_size=None):
+        logger.info("Mock Realtime API listening on ws://%s:%d", options.host, options.port)
+        await asyncio.get_running_loop().create_future()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Realtime API.")
+    parser.add_argument('--host', default="127.0.0.1", help="Interface to bind")
+    parser.add_argument('--port', type=int, default=8765, help="Port to bind")
+    parser.add_argument('--response-ms', type=int, default=2000, help="Audio length of each response")
+    parser.add_argument('--chunk-ms', type=int, default=100, help="Audio length of each response.audio.delta")
+    parser.add_argument('--speed', type=float, default=4.0, help="How many times faster than real time deltas are sent")
+    parser.add_argument('--first-audio-delay-ms', type=int, default=300, help="Model latency before the first delta")
+    parser.add_argument('--tool-calls', action='store_true',
+                        help="Answer each caller turn with a call to the session's first tool before replying")
+    parser.add_argument('--vad-silence-ms', type=int, default=500, help="Silence after speech that ends a turn")
+    return parser
+
+if __name__ == "__main__":
+    setup_logging('INFO')
+    asyncio.run(serve(build_parser().parse_args()))
@@ -0,0 +1,157 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+from asyncio import events
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+def callback_name(handle):
+    """Name the code an event-loop callback runs: the task's coroutine, or the callback itself."""
+    callback = handle._callback
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        # Tasks may wrap awaitables without a qualname, e.g. an async generator's aclose()
+        coro = owner.get_coro()
+        return getattr(coro, '__qualname__', type(coro).__name__)
+    return getattr(callback, '__qualname__', type(callback).__name__)
+
+def await_chain(task):
+    """Return the code objects of the coroutines task is suspended in, outermost first."""
+    codes = []
+    coro = task.get_coro()
+    while coro is not None and hasattr(coro, 'cr_code'):
+        codes.append(coro.cr_code)
+        coro = coro.cr_await
+    return codes
+
+def chain_name(codes):
+    """Name an await chain, e.g. "a > b > c"."""
+    return " > ".join(code.co_qualname for code in codes)
+
+class CallbackProfiler:
+    """Time every event-loop callback and attribute its wall and CPU time to the code that ran.
+
+    install() wraps asyncio's Handle._run, so it sees every task step and
+    transport callback on the default asyncio loop (not on uvloop). Totals
+    are kept per task coroutine or callback name; any callback running
+    longer than slow_threshold seconds blocked every call on the worker and
+    is logged and kept in a ring of the last keep occurrences. For a task
+    step, the await chain is captured before the step runs: the blocking
+    code ran from where the task resumed ("resumed_in") until it next
+    suspended ("suspended_in").
+    """
+
+    def __init__(self, slow_threshold=0.02, keep=200):
+        self.slow_threshold = slow_threshold
+        self.totals = {}  # name -> [callbacks, wall seconds, cpu seconds, max wall seconds]
+        self.slow = deque(maxlen=keep)
+        self.original_run = None
+        self.errors = 0
+
+    def install(self):
+        if self.original_run is not None:
+            return
+        if not isinstance(asyncio.get_running_loop(), asyncio.BaseEventLoop):
+            logger.warning("Callback profiling needs the default asyncio event loop; not installed")
+            return
+        original_run = self.original_run = events.Handle._run
+        record = self.record
+
+        def _run(handle):
+            try:
+                owner = getattr(handle._callback, '__self__', None)
+                resumed_in = await_chain(owner) if isinstance(owner, asyncio.Task) else None
+            except Exception:
+                resumed_in = None
+            started = time.perf_counter()
+            cpu_started = time.thread_time()
+            try:
+                return original_run(handle)
+            finally:
+                record(handle, time.perf_counter() - started, time.thread_time() - cpu_started, resumed_in)
+
+        events.Handle._run = _run
+        logger.info("Callback profiling installed (slow threshold %.0f ms)", self.slow_threshold * 1000)
+
+    def uninstall(self):
+        if self.original_run is not None:
+            events.Handle._run = self.original_run
+            self.original_run = None
+
+    def record(self, handle, wall, cpu, resumed_in=None):
+        # Runs inside Handle._run; an exception here would stop the event loop
+        try:
+            self._record(handle, wall, cpu, resumed_in)
+        except Exception as e:
+            self.errors += 1
+            logger.error("Callback profiler failed to record %r: %r", handle, e)
+
+    def _record(self, handle, wall, cpu, resumed_in):
+        name = callback_name(handle)
+        totals = self.totals.get(name)
+        if totals is None:
+            totals = self.totals[name] = [0, 0.0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        if wall > totals[3]:
+            totals[3] = wall
+        if wall > self.slow_threshold:
+            slow = {"at": time.time(), "name": name, "seconds": wall, "cpu_seconds": cpu}
+            if resumed_in is not None:
+                owner = handle._callback.__self__
+                slow["resumed_in"] = chain_name(resumed_in) or name
+                slow["suspended_in"] = None if owner.done() else chain_name(await_chain(owner))
+            self.slow.append(slow)
+            logger.warning(
+                "Slow callback %s blocked the event loop for %.1f ms", slow.get("resumed_in", name), wall * 1000
+            )
+
+    def report(self):
+        """Return per-name totals, busiest first, and the recent slow callbacks."""
+        tasks = [
+            {"name": name, "callbacks": count, "seconds": wall, "cpu_seconds": cpu, "max_seconds": longest}
+            for name, (count, wall, cpu, longest) in self.totals.items()
+        ]
+        tasks.sort(key=lambda entry: entry["cpu_seconds"], reverse=True)
+        return {
+            "slow_threshold_seconds": self.slow_threshold, "tasks": tasks, "slow_callbacks": list(self.slow),
+            "errors": self.errors,
+        }
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+def sample_stacks(thread_id, seconds, interval=0.005):
+    """Sample thread_id's Python stack for seconds and return it in collapsed ("folded") format.
+
+    Each output line is "outer;...;inner count", the input expected by
+    flamegraph.pl, speedscope and inferno. Blocking; run it off the sampled
+    thread.
+    """
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+profile_lock = threading.Lock()
+
+async def profile_event_loop(seconds, interval=0.005):
+    """Sample the running event loop's thread from a helper thread; None if a profile is already running."""
+    if not profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds, interval)
+    finally:
+        profile_lock.release()
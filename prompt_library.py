@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from twilio_media import ULAW_BYTES_PER_MS
+
+# File layout: MAGIC, little-endian uint32 index length, JSON index {name: [offset, length]}, clip bytes.
+# Offsets are from the start of the file.
+MAGIC = b'ULAWLIB1'
+HEADER = struct.Struct('<8sI')
+WAVE_FORMAT_MULAW = 7
+
+class PromptLibrary:
+    """Read-only library of pre-encoded 8 kHz μ-law clips in one memory-mapped file.
+
+    Every worker process maps the same file, so the clips live once in the
+    page cache and clip() hands out zero-copy memoryview slices of it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a prompt library")
+        self.index = json.loads(self.map[HEADER.size:HEADER.size + index_length])
+        self.view = memoryview(self.map)
+
+    def names(self):
+        return sorted(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def clip(self, name):
+        """Return the μ-law audio of name as a memoryview; raises KeyError for unknown names."""
+        offset, length = self.index[name]
+        return self.view[offset:offset + length]
+
+    def duration_ms(self, name):
+        return self.index[name][1] / ULAW_BYTES_PER_MS
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+def write_library(path, clips):
+    """Write clips, a {name: μ-law bytes} mapping, as a library file, replacing path atomically."""
+    index = {}
+    offset = 0
+    for name, audio in clips.items():
+        index[name] = [offset, len(audio)]
+        offset += len(audio)
+    # Offsets depend on the index length, which depends on the offsets; settle it by iterating
+    base = 0
+    while True:
+        encoded = json.dumps({name: [base + start, length] for name, (start, length) in index.items()}).encode('utf-8')
+        if HEADER.size + len(encoded) == base:
+            break
+        base = HEADER.size + len(encoded)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(encoded)))
+        f.write(encoded)
+        for audio in clips.values():
+            f.write(audio)
+    os.replace(temporary, path)
+
+def read_clip(path):
+    """Read raw μ-law (.ulaw, .raw) or a μ-law WAV file into bytes."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(b'RIFF'):
+        return data
+    position = 12
+    audio_format = None
+    while position + 8 <= len(data):
+        chunk_id, size = struct.unpack_from('<4sI', data, position)
+        body = data[position + 8:position + 8 + size]
+        if chunk_id == b'fmt ':
+            audio_format, channels, sample_rate = struct.unpack_from('<HHI', body)
+            if (audio_format, channels, sample_rate) != (WAVE_FORMAT_MULAW, 1, 8000):
+                raise ValueError(f"{path} is not 8 kHz mono μ-law")
+        elif chunk_id == b'data':
+            if audio_format is None:
+                raise ValueError(f"{path} has no fmt chunk before its data")
+            return body
+        position += 8 + size + (size & 1)
+    raise ValueError(f"{path} has no data chunk")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped μ-law prompt library.")
+    parser.add_argument('library', help="Library file to write or list")
+    parser.add_argument('clips', nargs='*',
+                        help="Clips as name=path or path (named after the file), raw μ-law or μ-law WAV")
+    args = parser.parse_args()
+
+    if not args.clips:
+        library = PromptLibrary(args.library)
+        for name in library.names():
+            print(f"{name:<30} {library.duration_ms(name) / 1000:>7.2f} s")
+        sys.exit(0)
+
+    clips = {}
+    for spec in args.clips:
+        name, _, path = spec.rpartition('=')
+        clips[name or os.path.splitext(os.path.basename(path))[0]] = read_clip(path)
+    write_library(args.library, clips)
+    print(f"Wrote {len(clips)} clips to {args.library}")
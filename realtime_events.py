@@ -0,0 +1,67 @@
+import json
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:  # orjson is optional; the stdlib parser is the fallback
+    loads = json.loads
+
+# OpenAI serializes events compactly with "type" as the first key
+TYPE_PREFIX = '{"type":"'
+
+def peek_event_type(message):
+    """Return the event type of a raw Realtime API message without parsing it.
+
+    Falls back to a full parse when the message does not start with the
+    compact "type" key, so the result is always correct.
+    """
+    if message.startswith(TYPE_PREFIX):
+        end = message.find('"', len(TYPE_PREFIX))
+        if end != -1:
+            return message[len(TYPE_PREFIX):end]
+    try:
+        return loads(message).get('type')
+    except (ValueError, AttributeError):
+        return None
+
+def peek_string_field(message, field):
+    """Return a top-level string field that cannot contain quotes (ids, base64) from a raw message.
+
+    Returns None when the field is not found; callers should then parse the message.
+    """
+    key = f'"{field}":"'
+    start = message.find(key)
+    if start == -1:
+        return None
+    start += len(key)
+    end = message.find('"', start)
+    if end == -1:
+        return None
+    return message[start:end]
+
+class EventDispatcher:
+    """Route Realtime API messages to handlers keyed by event type.
+
+    Only messages with a registered handler are parsed. Handlers registered
+    with raw=True receive the undecoded message string instead of a dict.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, *event_types, raw=False):
+        """Register the decorated coroutine for one or more event types."""
+        def register(handler):
+            for event_type in event_types:
+                self.handlers[event_type] = (handler, raw)
+            return handler
+        return register
+
+    async def dispatch(self, message):
+        """Handle one raw message and return its event type."""
+        event_type = peek_event_type(message)
+        entry = self.handlers.get(event_type)
+        if entry is not None:
+            handler, raw = entry
+            await handler(message if raw else loads(message))
+        return event_type
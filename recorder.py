@@ -0,0 +1,234 @@
+import os
+import time
+import queue
+import struct
+import logging
+import threading
+from twilio_media import ULAW_BYTES_PER_MS
+from prompt_library import WAVE_FORMAT_MULAW
+
+logger = logging.getLogger(__name__)
+
+# μ-law code for zero amplitude, used to fill gaps so both tracks of a call stay aligned
+ULAW_SILENCE = b'\xff'
+# RIFF header, 18-byte fmt chunk, fact chunk and data chunk header of an 8 kHz mono μ-law WAV
+WAV_HEADER_BYTES = 12 + 8 + 18 + 8 + 4 + 8
+
+def wav_header(data_bytes):
+    """Header of an 8 kHz mono μ-law WAV file holding data_bytes of audio."""
+    return (
+        b'RIFF' + struct.pack('<I', WAV_HEADER_BYTES - 8 + data_bytes + (data_bytes & 1)) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHHH', 18, WAVE_FORMAT_MULAW, 1, 8000, 8000, 1, 8, 0)
+        + b'fact' + struct.pack('<II', 4, data_bytes)
+        + b'data' + struct.pack('<I', data_bytes)
+    )
+
+class Track:
+    """One direction of a call's audio, buffered on the event loop and handed to the writer thread.
+
+    Audio is placed on the call's wall-clock timeline: when it arrives more
+    than the recorder's slack behind schedule, the gap is filled with
+    silence so the caller and assistant files line up. At most the
+    recorder's buffer_bytes are held per track; if the writer is backed up
+    beyond that, buffered audio is dropped, counted and replaced by silence.
+    Audio written after close(), e.g. during call teardown, is ignored.
+    Outbound audio should be stamped with when it finishes playing, which
+    may be ahead of the wall clock, not when it was sent.
+    """
+
+    def __init__(self, recorder, path, started_at):
+        self.recorder = recorder
+        self.path = path
+        self.started_at = started_at
+        self.buffer = bytearray()
+        self.gap = 0  # Silence owed ahead of buffer
+        self.position = 0  # Bytes of timeline covered, silence included
+        self.dropped_bytes = 0
+        self.closed = False
+        self.file = None  # Owned by the writer thread
+        self.finalized = False  # Set by the writer thread
+        self.written = 0
+
+    def write(self, audio, now=None):
+        """Append μ-law audio that ends at monotonic time now (by default, audio just received)."""
+        if self.closed:
+            return
+        now = time.monotonic() if now is None else now
+        behind = int((now - self.started_at) * 1000) * ULAW_BYTES_PER_MS - self.position - len(audio)
+        if behind > self.recorder.slack_bytes:
+            if not self.hand_off():
+                self.drop()
+            self.gap += behind
+            self.position += behind
+        if len(self.buffer) + len(audio) > self.recorder.buffer_bytes:
+            self.drop()
+        self.buffer += audio
+        self.position += len(audio)
+        if len(self.buffer) >= self.recorder.chunk_bytes:
+            self.hand_off()
+
+    def hand_off(self):
+        """Queue the buffered audio for the writer; False if the writer is too far behind."""
+        if not self.buffer and not self.gap:
+            return True
+        if not self.recorder.submit(self, self.gap, bytes(self.buffer)):
+            return False
+        self.gap = 0
+        self.buffer.clear()
+        return True
+
+    def drop(self):
+        self.dropped_bytes += len(self.buffer)
+        self.gap += len(self.buffer)
+        self.buffer.clear()
+
+    def pad_to(self, position):
+        """Extend the timeline with silence up to position bytes."""
+        if position > self.position:
+            self.gap += position - self.position
+            self.position = position
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.hand_off():
+            self.drop()
+            self.recorder.submit(self, self.gap, b'', force=True)
+        self.recorder.finalize(self)
+
+class Recording:
+    """A call's caller and assistant tracks, written as two aligned μ-law WAV files.
+
+    On close both tracks are padded with silence to the call's length, or to
+    the end of the longer track, so the files have the same duration.
+    """
+
+    def __init__(self, recorder, name):
+        self.name = name
+        started_at = self.started_at = time.monotonic()
+        self.caller = Track(recorder, os.path.join(recorder.directory, f"{name}-caller.wav"), started_at)
+        self.assistant = Track(recorder, os.path.join(recorder.directory, f"{name}-assistant.wav"), started_at)
+        self.closed = False
+
+    @property
+    def dropped_bytes(self):
+        return self.caller.dropped_bytes + self.assistant.dropped_bytes
+
+    def close(self):
+        """Flush both tracks and have the writer finalize their WAV headers."""
+        if self.closed:
+            return
+        self.closed = True
+        elapsed = int((time.monotonic() - self.started_at) * 1000) * ULAW_BYTES_PER_MS
+        end = max(elapsed, self.caller.position, self.assistant.position)
+        for track in (self.caller, self.assistant):
+            track.pad_to(end)
+            track.close()
+        if self.dropped_bytes:
+            logger.warning(
+                "Recording %s dropped %.1f s of audio because the disk could not keep up",
+                self.name, self.dropped_bytes / ULAW_BYTES_PER_MS / 1000
+            )
+
+class CallRecorder:
+    """Writes call recordings from a background thread so disk I/O never blocks the event loop.
+
+    Tracks hand over chunk_ms chunks; at most max_queued_ms of audio across
+    all calls waits for the writer, beyond which tracks keep up to
+    buffer_ms each before dropping.
+    """
+
+    def __init__(self, directory, chunk_ms=1000, buffer_ms=10000, max_queued_ms=120000, slack_ms=200):
+        self.directory = directory
+        self.chunk_bytes = chunk_ms * ULAW_BYTES_PER_MS
+        self.buffer_bytes = max(buffer_ms * ULAW_BYTES_PER_MS, self.chunk_bytes)
+        self.max_queued_bytes = max_queued_ms * ULAW_BYTES_PER_MS
+        self.slack_bytes = slack_ms * ULAW_BYTES_PER_MS
+        self.queue = queue.SimpleQueue()
+        self.queued_bytes = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.recordings = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self.thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.thread = threading.Thread(target=self._run, name='call-recorder', daemon=True)
+            self.thread.start()
+
+    def close(self):
+        """Finish all queued writes and stop the writer thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def open(self, name):
+        self.start()
+        self.recordings += 1
+        return Recording(self, name)
+
+    def submit(self, track, gap, chunk, force=False):
+        """Queue a write of gap bytes of silence then chunk; refused when the backlog is full unless forced."""
+        with self.lock:
+            if not force and self.queued_bytes + len(chunk) > self.max_queued_bytes:
+                return False
+            self.queued_bytes += len(chunk)
+        self.queue.put((track, gap, chunk))
+        return True
+
+    def finalize(self, track):
+        self.queue.put((track, None, None))
+
+    @property
+    def backlog_seconds(self):
+        return self.queued_bytes / ULAW_BYTES_PER_MS / 1000
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            track, gap, chunk = job
+            try:
+                if gap is None:
+                    self._finalize(track)
+                else:
+                    self._write(track, gap, chunk)
+            except OSError as e:
+                self.write_errors += 1
+                logger.error("Failed to write recording %s: %s", track.path, e)
+            finally:
+                if chunk:
+                    with self.lock:
+                        self.queued_bytes -= len(chunk)
+
+    def _write(self, track, gap, chunk):
+        if track.finalized:
+            # Reopening would truncate the finished file
+            return
+        if track.file is None:
+            track.file = open(track.path, 'wb')
+            track.file.write(wav_header(0))
+        while gap > 0:
+            fill = min(gap, self.chunk_bytes)
+            track.file.write(ULAW_SILENCE * fill)
+            track.written += fill
+            gap -= fill
+        track.file.write(chunk)
+        track.written += len(chunk)
+        self.bytes_written += len(chunk)
+
+    def _finalize(self, track):
+        track.finalized = True
+        if track.file is None:
+            return
+        with track.file as f:
+            if track.written & 1:
+                f.write(b'\0')
+            f.seek(0)
+            f.write(wav_header(track.written))
+        track.file = None
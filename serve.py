@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+from dotenv import load_dotenv
+from metrics import ACTIVE_CALLS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv('PORT', 5050))
+# Seconds to wait on SIGTERM for in-flight calls to finish before they are cut off
+DRAIN_TIMEOUT = int(os.getenv('DRAIN_TIMEOUT', 300))
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that lets in-flight calls finish on shutdown.
+
+    uvicorn closes every open WebSocket as soon as shutdown starts, which
+    would hang up live callers. This server first stops accepting new
+    connections, then waits up to drain_timeout seconds for the active call
+    count to reach zero before handing over to uvicorn's own shutdown. A
+    second Ctrl+C skips the wait.
+    """
+
+    def __init__(self, config, drain_timeout=DRAIN_TIMEOUT):
+        super().__init__(config)
+        self.drain_timeout = drain_timeout
+
+    async def shutdown(self, sockets=None):
+        # Stop accepting new connections (uvicorn repeats this harmlessly)
+        for server in self.servers:
+            server.close()
+        for sock in sockets or []:
+            sock.close()
+
+        deadline = time.monotonic() + self.drain_timeout
+        if ACTIVE_CALLS.value > 0:
+            logger.info("Draining %d active call(s) for up to %d s", ACTIVE_CALLS.value, self.drain_timeout)
+        while ACTIVE_CALLS.value > 0 and not self.force_exit and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        if ACTIVE_CALLS.value > 0:
+            logger.warning("Drain timeout reached with %d active call(s)", ACTIVE_CALLS.value)
+
+        await super().shutdown(sockets)
+
+def run_server(app, host="0.0.0.0", port=PORT, workers=1, drain_timeout=DRAIN_TIMEOUT):
+    """Serve app with graceful drain, in one process or as a supervisor over several workers.
+
+    With more than one worker, app must be an import string ("functional_main:app")
+    so every worker process imports and initializes its own copy. Workers
+    see the worker count in SERVE_WORKERS.
+    """
+    os.environ['SERVE_WORKERS'] = str(workers)
+    config = uvicorn.Config(app, host=host, port=port, workers=workers)
+    server = DrainingServer(config, drain_timeout=drain_timeout)
+    if workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Twilio AI voice assistant server with several worker processes.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (default: one per CPU)")
+    parser.add_argument('--host', default="0.0.0.0", help="Interface to bind")
+    parser.add_argument('--port', type=int, default=PORT, help="Port to bind")
+    args = parser.parse_args()
+
+    run_server("functional_main:app", host=args.host, port=args.port, workers=args.workers)
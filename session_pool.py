@@ -0,0 +1,252 @@
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from websockets.protocol import State
+
+logger = logging.getLogger(__name__)
+
+async def wait_for_event(openai_ws, event_type, timeout):
+    """Consume Realtime API messages until one of event_type arrives."""
+    async def wait():
+        async for message in openai_ws:
+            if json.loads(message).get('type') == event_type:
+                return
+        raise ConnectionError(f"Connection closed before {event_type}")
+    await asyncio.wait_for(wait(), timeout)
+
+class RealtimeSessionPool:
+    """Keep Realtime API sessions connected and configured ahead of incoming calls.
+
+    open_session is a coroutine function returning a connected WebSocket that
+    has already been sent its session.update. Pooled sessions are held until
+    the server acknowledges the update, handed out by acquire(), refilled in
+    the background and closed once they have idled for max_idle seconds. A
+    session's maximum duration counts from when it connected, so idle time
+    comes off the longest call it can serve; keep max_idle short. on_ready,
+    if given, is called with each session once its session.updated arrives.
+    """
+
+    def __init__(self, open_session, size, max_idle=90, ack_timeout=10, on_ready=None):
+        self.open_session = open_session
+        self.on_ready = on_ready
+        self.size = size
+        self.max_idle = max_idle
+        self.ack_timeout = ack_timeout
+        self.idle = deque()  # (openai_ws, ready_at) pairs, oldest first
+        self.refilling = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.refill_failures = 0
+        self.refill_count = 0
+        self.refill_seconds_total = 0.0
+        self.last_refill_seconds = None
+
+    async def start(self):
+        """Start filling the pool in the background."""
+        if self.size > 0 and self.task is None:
+            self.task = asyncio.create_task(self._refill_loop())
+
+    async def close(self):
+        """Stop refilling and close every idle session."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        while self.idle:
+            openai_ws, _ = self.idle.popleft()
+            await openai_ws.close()
+
+    async def acquire(self):
+        """Return a configured session, opening one on the spot if the pool is empty."""
+        self._evict_stale()
+        if self.idle:
+            openai_ws, _ = self.idle.popleft()
+            self.hits += 1
+            self.wakeup.set()
+            return openai_ws
+        self.misses += 1
+        self.wakeup.set()
+        return await self.open_session()
+
+    def stats(self):
+        """Return pool counters for the metrics surface."""
+        return {
+            "size": self.size,
+            "idle": len(self.idle),
+            "refilling": self.refilling,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "refill_failures": self.refill_failures,
+            "refill_count": self.refill_count,
+            "refill_seconds_total": self.refill_seconds_total,
+            "last_refill_seconds": self.last_refill_seconds,
+        }
+
+    def _evict_stale(self):
+        now = time.monotonic()
+        while self.idle:
+            openai_ws, ready_at = self.idle[0]
+            if openai_ws.state is State.OPEN and now - ready_at < self.max_idle:
+                break
+            self.idle.popleft()
+            self.expired += 1
+            asyncio.create_task(openai_ws.close())
+
+    async def _refill_one(self):
+        started = time.monotonic()
+        openai_ws = None
+        try:
+            openai_ws = await self.open_session()
+            await wait_for_event(openai_ws, 'session.updated', self.ack_timeout)
+            if self.on_ready:
+                self.on_ready(openai_ws)
+        except Exception as e:
+            self.refill_failures += 1
+            logger.warning("Failed to pre-warm OpenAI session: %s", e)
+            if openai_ws is not None:
+                await openai_ws.close()
+            # Back off so a failing upstream is not hammered
+            await asyncio.sleep(1)
+            return
+        finally:
+            self.refilling -= 1
+
+        elapsed = time.monotonic() - started
+        self.refill_count += 1
+        self.refill_seconds_total += elapsed
+        self.last_refill_seconds = elapsed
+        self.idle.append((openai_ws, time.monotonic()))
+
+    async def _refill_loop(self):
+        while True:
+            self._evict_stale()
+            missing = self.size - len(self.idle) - self.refilling
+            if missing > 0:
+                self.refilling += missing
+                await asyncio.gather(*(self._refill_one() for _ in range(missing)))
+                continue
+
+            # Sleep until a session is taken, waking periodically to expire idle ones
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=min(self.max_idle / 4, 30))
+            except asyncio.TimeoutError:
+                pass
+
+class SpeculativeSession:
+    """A session being prepared for a call whose media stream has not arrived yet."""
+
+    def __init__(self):
+        self.openai_ws = None
+        self.buffer = []  # Raw Realtime API messages received before the stream arrived
+        self.ready = asyncio.Event()
+        self.task = None
+        self.expiry = None
+
+class SpeculativeSessions:
+    """Start OpenAI sessions for calls announced by a webhook, keyed by CallSid.
+
+    Between the webhook and Twilio opening /media-stream the caller is still
+    hearing the TwiML preamble, so the session is taken from the pool, prepared
+    with prepare(openai_ws, *args) (greeting sent) and its output buffered
+    until claim() hands it to the stream whose start event carries the same
+    CallSid. Unclaimed sessions are closed after ttl seconds.
+    """
+
+    def __init__(self, pool, prepare, ttl=60):
+        self.pool = pool
+        self.prepare = prepare
+        self.ttl = ttl
+        self.pending = {}
+        self.started = 0
+        self.claimed = 0
+        self.expired = 0
+        self.failed = 0
+
+    def start(self, call_sid, *args):
+        """Begin preparing a session for call_sid in the background; args are passed on to prepare."""
+        if not call_sid or call_sid in self.pending:
+            return
+        entry = SpeculativeSession()
+        entry.task = asyncio.create_task(self._run(entry, args))
+        entry.expiry = asyncio.get_running_loop().call_later(
+            self.ttl, lambda: asyncio.create_task(self._expire(call_sid))
+        )
+        self.pending[call_sid] = entry
+        self.started += 1
+
+    async def claim(self, call_sid):
+        """Return (openai_ws, buffered_messages) for call_sid, or None if nothing usable was prepared."""
+        entry = self.pending.pop(call_sid, None)
+        if entry is None:
+            return None
+        entry.expiry.cancel()
+        await entry.ready.wait()
+        await self._stop(entry)
+        if entry.openai_ws is None or entry.openai_ws.state is not State.OPEN:
+            self.failed += 1
+            return None
+        self.claimed += 1
+        return entry.openai_ws, entry.buffer
+
+    def stats(self):
+        """Return speculative session counters for the metrics surface."""
+        return {
+            "pending": len(self.pending),
+            "started": self.started,
+            "claimed": self.claimed,
+            "expired": self.expired,
+            "failed": self.failed,
+        }
+
+    async def close(self):
+        """Close every session that was never claimed."""
+        for call_sid in list(self.pending):
+            await self._expire(call_sid)
+
+    async def _run(self, entry, args):
+        try:
+            entry.openai_ws = await self.pool.acquire()
+            await self.prepare(entry.openai_ws, *args)
+        except Exception as e:
+            logger.warning("Failed to prepare speculative OpenAI session: %s", e)
+            if entry.openai_ws is not None:
+                await entry.openai_ws.close()
+            entry.openai_ws = None
+            return
+        finally:
+            entry.ready.set()
+
+        # Hold everything the model produces until the stream claims it
+        try:
+            async for message in entry.openai_ws:
+                entry.buffer.append(message)
+        except Exception:
+            pass
+
+    async def _stop(self, entry):
+        entry.task.cancel()
+        try:
+            await entry.task
+        except asyncio.CancelledError:
+            pass
+
+    async def _expire(self, call_sid):
+        entry = self.pending.pop(call_sid, None)
+        if entry is None:
+            return
+        entry.expiry.cancel()
+        self.expired += 1
+        await entry.ready.wait()
+        await self._stop(entry)
+        if entry.openai_ws is not None:
+            await entry.openai_ws.close()
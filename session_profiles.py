@@ -0,0 +1,119 @@
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SessionProfile:
+    """A named session configuration whose session.update message is serialized once."""
+
+    def __init__(self, name, session):
+        self.name = name
+        self.session = session
+        self.payload = json.dumps({"type": "session.update", "session": session})
+
+    @property
+    def voice(self):
+        return self.session.get('voice')
+
+class SessionProfiles:
+    """Named session profiles loaded from a JSON file and reloaded when it changes.
+
+    The file looks like {"default": name, "numbers": {number: name},
+    "profiles": {name: settings}}. build(settings) turns one profile's
+    settings into a full session dict; the result is serialized once, so a
+    call only sends a prebuilt string. A built-in "default" profile,
+    build({}), applies when there is no file. The file is checked every
+    poll_interval seconds and on_reload() is called after each successful
+    reload; a file that fails to load leaves the previous profiles in place.
+    """
+
+    def __init__(self, path, build, poll_interval=2.0, on_reload=None):
+        self.path = path
+        self.build = build
+        self.poll_interval = poll_interval
+        self.on_reload = on_reload
+        self.default = 'default'
+        self.profiles = {'default': SessionProfile('default', build({}))}
+        self.numbers = {}
+        self.mtime = None
+        self.task = None
+        self.reloads = 0
+        self.reload_failures = 0
+
+    async def start(self):
+        """Load the file and keep watching it in the background."""
+        await asyncio.to_thread(self.load)
+        if self.task is None and self.poll_interval > 0:
+            self.task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get(self, name=None):
+        """Return the named profile, or the default one for None or an unknown name."""
+        profile = self.profiles.get(name or self.default)
+        if profile is None:
+            logger.warning("Unknown session profile %r; using %s", name, self.default)
+            profile = self.profiles[self.default]
+        return profile
+
+    def for_number(self, number):
+        """Return the name of the profile assigned to a phone number, or None."""
+        return self.numbers.get(number)
+
+    def load(self, force=False):
+        """Load the file if it changed since the last load; return whether the profiles were replaced."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime and not force:
+            return False
+        self.mtime = mtime
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                config = json.load(f)
+            profiles = {'default': SessionProfile('default', self.build({}))}
+            for name, settings in config.get('profiles', {}).items():
+                profiles[name] = SessionProfile(name, self.build(dict(settings)))
+            default = config.get('default', 'default')
+            numbers = dict(config.get('numbers', {}))
+            unknown = {default, *numbers.values()} - profiles.keys()
+            if unknown:
+                raise ValueError(f"Unknown profiles {sorted(unknown)}")
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            self.reload_failures += 1
+            logger.error("Failed to load session profiles from %s; keeping the previous ones: %s", self.path, e)
+            return False
+        self.profiles, self.default, self.numbers = profiles, default, numbers
+        self.reloads += 1
+        logger.info("Loaded %d session profiles from %s (default %s)", len(profiles), self.path, default)
+        return True
+
+    def stats(self):
+        return {
+            "default": self.default,
+            "profiles": {name: {"voice": profile.voice} for name, profile in sorted(self.profiles.items())},
+            "numbers": self.numbers,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+        }
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                reloaded = await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error("Session profile watcher failed: %r", e)
+                continue
+            if reloaded and self.on_reload:
+                self.on_reload()
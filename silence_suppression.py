@@ -0,0 +1,61 @@
+from collections import deque
+from audio_dsp import NUMPY_AVAILABLE, ulaw_decode, level_db
+
+class SilenceSuppressor:
+    """Hold back inbound frames during sustained caller silence or comfort noise.
+
+    A frame is silent when its level is below threshold_db dBFS. Frames
+    keep flowing for hangover_ms after the caller goes quiet, so OpenAI's
+    VAD still sees the silence that ends a turn; after that they are
+    suppressed. The last preroll_ms of suppressed frames are sent ahead of
+    the first loud frame so speech onsets aren't clipped, and one frame is
+    let through every keepalive_ms (0 for never) so the upstream audio
+    never stops entirely.
+    """
+
+    def __init__(self, threshold_db=-50.0, hangover_ms=1000, preroll_ms=100, keepalive_ms=10000, frame_ms=20):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("Silence suppression needs numpy")
+        self.threshold_db = threshold_db
+        self.hangover_ms = hangover_ms
+        self.keepalive_ms = keepalive_ms
+        self.frame_ms = frame_ms
+        self.preroll = deque(maxlen=max(0, preroll_ms // frame_ms))  # (payload, decoded size) of recent suppressed frames
+        self.silent_ms = 0
+        self.since_forward_ms = 0
+        self.suppressing = False
+        self.frames_suppressed = 0
+        self.bytes_suppressed = 0
+        self.suppressions = 0
+
+    def frame(self, payload, ulaw):
+        """Take one frame, as its base64 payload and decoded μ-law, and return the payloads to forward."""
+        if level_db(ulaw_decode(ulaw)) >= self.threshold_db:
+            self.silent_ms = 0
+            if not self.suppressing:
+                return (payload,)
+            self.suppressing = False
+            forward = [held for held, _ in self.preroll]
+            forward.append(payload)
+            self.frames_suppressed -= len(self.preroll)
+            self.bytes_suppressed -= sum(size for _, size in self.preroll)
+            self.preroll.clear()
+            return forward
+
+        self.silent_ms += self.frame_ms
+        if not self.suppressing:
+            if self.silent_ms <= self.hangover_ms:
+                return (payload,)
+            self.suppressing = True
+            self.suppressions += 1
+            self.since_forward_ms = 0
+        self.since_forward_ms += self.frame_ms
+        if self.keepalive_ms and self.since_forward_ms >= self.keepalive_ms:
+            # Held frames are older than this one, so they can no longer serve as preroll
+            self.since_forward_ms = 0
+            self.preroll.clear()
+            return (payload,)
+        self.preroll.append((payload, len(ulaw)))
+        self.frames_suppressed += 1
+        self.bytes_suppressed += len(ulaw)
+        return ()
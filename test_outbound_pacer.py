@@ -0,0 +1,37 @@
+import time
+import asyncio
+from twilio_media import OutboundPacer, FRAME_MS, ULAW_BYTES_PER_MS
+
+async def pace(chunk_ms, chunk_count, arrival_ms, lead_ms=100, gap_after=None, gap_ms=0):
+    """Feed chunk_count chunks of chunk_ms audio every arrival_ms; return the send times and the pacer."""
+    sent = []
+
+    async def send_frame(payload):
+        sent.append(time.monotonic())
+
+    pacer = OutboundPacer(send_frame, lead_ms=lead_ms)
+    runner = asyncio.create_task(pacer.run())
+    started = time.monotonic()
+    for i in range(chunk_count):
+        await pacer.add('item_1', b'\xff' * (chunk_ms * ULAW_BYTES_PER_MS))
+        await asyncio.sleep((gap_ms if i == gap_after else arrival_ms) / 1000)
+    while pacer.segments:
+        await asyncio.sleep(0.01)
+    runner.cancel()
+    return [t - started for t in sent], pacer
+
+def test_small_chunks_faster_than_real_time_are_paced():
+    # 2 s of audio in 100 ms chunks arriving every 25 ms, i.e. 4x real time
+    sent, pacer = asyncio.run(pace(100, 20, 25))
+    assert len(sent) == 2000 // FRAME_MS
+    # Each frame goes out no earlier than its playout time minus the lead
+    for i, at in enumerate(sent):
+        assert at >= i * FRAME_MS / 1000 - 0.1 - 0.03
+    assert sent[-1] >= 1.8
+    assert pacer.underruns == 0
+
+def test_gap_in_a_reply_counts_an_underrun():
+    # 200 ms of audio, then nothing for 500 ms, then more of the same item
+    sent, pacer = asyncio.run(pace(100, 3, 10, gap_after=1, gap_ms=500))
+    assert len(sent) == 300 // FRAME_MS
+    assert pacer.underruns == 1
@@ -0,0 +1,33 @@
+import os
+from recorder import CallRecorder, WAV_HEADER_BYTES
+from twilio_media import FRAME_BYTES, FRAME_MS
+
+def data_seconds(path):
+    return (os.path.getsize(path) - WAV_HEADER_BYTES) / 8000
+
+def test_tracks_match_the_call_length(tmp_path):
+    recorder = CallRecorder(str(tmp_path), chunk_ms=100)
+    recording = recorder.open('CA1')
+    start = recording.started_at
+    # 1 s of caller audio, received in real time
+    for i in range(1000 // FRAME_MS):
+        recording.caller.write(b'\x7f' * FRAME_BYTES, start + (i + 1) * FRAME_MS / 1000)
+    # A 0.5 s reply sent in one burst at 0.2 s but stamped with when each frame plays
+    for i in range(500 // FRAME_MS):
+        recording.assistant.write(b'\x7f' * FRAME_BYTES, start + 0.2 + (i + 1) * FRAME_MS / 1000)
+    recording.close()
+    recorder.close()
+
+    caller = data_seconds(tmp_path / 'CA1-caller.wav')
+    assistant = data_seconds(tmp_path / 'CA1-assistant.wav')
+    assert abs(caller - 1.0) < 0.001
+    assert abs(assistant - caller) < 0.001
+
+def test_audio_after_close_leaves_the_file_intact(tmp_path):
+    recorder = CallRecorder(str(tmp_path), chunk_ms=20)
+    recording = recorder.open('CA2')
+    recording.caller.write(b'\x7f' * 8000, recording.started_at + 1)
+    recording.close()
+    recording.caller.write(b'\x7f' * 8000, recording.started_at + 2)
+    recorder.close()
+    assert abs(data_seconds(tmp_path / 'CA2-caller.wav') - 1.0) < 0.001
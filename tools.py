@@ -0,0 +1,160 @@
+import json
+import time
+import asyncio
+import logging
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """LRU cache of tool results whose entries also expire after their tool's TTL."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key -> (monotonic expiry, output)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, output, ttl):
+        self.entries[key] = (time.monotonic() + ttl, output)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+class Tool:
+    def __init__(self, function, name, description, parameters, timeout, cache_ttl):
+        self.function = function
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.is_async = asyncio.iscoroutinefunction(function)
+
+    def definition(self):
+        return {"type": "function", "name": self.name, "description": self.description, "parameters": self.parameters}
+
+class ToolRegistry:
+    """Functions the assistant can call through Realtime API function calling.
+
+    Register tools with the tool() decorator; definitions() goes into
+    session.update. call() runs one tool with at most max_concurrency
+    tools running at once across all calls: coroutine functions on the
+    event loop, plain functions on a thread pool of the same size, so a
+    slow lookup never stalls audio. Each tool has its own timeout, and a
+    tool with cache_ttl has its results memoized per arguments in an LRU
+    cache for that many seconds. Failures come back to the model as an
+    {"error": ...} output rather than raising.
+
+    A thread can't be interrupted, so a plain function that times out keeps
+    its thread and its concurrency slot until it returns; later calls wait
+    for a free slot instead of queueing behind it in the pool.
+    """
+
+    def __init__(self, max_concurrency=8, cache_size=256):
+        self.tools = {}
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='tools')
+        self.cache = ResultCache(cache_size)
+        self.calls = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.overrunning = 0  # Timed-out plain functions still holding a thread
+
+    def tool(self, description, parameters=None, name=None, timeout=5.0, cache_ttl=0):
+        """Register the decorated function; parameters is the JSON Schema of its keyword arguments."""
+        def register(function):
+            tool_name = name or function.__name__
+            self.tools[tool_name] = Tool(
+                function, tool_name, description, parameters or {"type": "object", "properties": {}}, timeout, cache_ttl
+            )
+            return function
+        return register
+
+    def definitions(self):
+        return [tool.definition() for tool in self.tools.values()]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def call(self, name, arguments):
+        """Run tool name with its JSON arguments string and return the output string for the model."""
+        self.calls += 1
+        tool = self.tools.get(name)
+        if tool is None:
+            self.errors += 1
+            return json.dumps({"error": f"Unknown tool {name}"})
+        try:
+            kwargs = json.loads(arguments) if arguments else {}
+            if not isinstance(kwargs, dict):
+                raise ValueError("arguments must be a JSON object")
+        except ValueError as e:
+            self.errors += 1
+            return json.dumps({"error": f"Invalid arguments: {e}"})
+
+        key = (name, json.dumps(kwargs, sort_keys=True))
+        if tool.cache_ttl:
+            output = self.cache.get(key)
+            if output is not None:
+                self.cache_hits += 1
+                return output
+
+        await self.semaphore.acquire()
+        thread_future = None
+        try:
+            if tool.is_async:
+                result = await asyncio.wait_for(tool.function(**kwargs), tool.timeout)
+            else:
+                thread_future = self.executor.submit(functools.partial(tool.function, **kwargs))
+                # Shielded so a timeout leaves the thread's future alone; its slot is freed when it returns
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(thread_future)), tool.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning("Tool %s timed out after %.1f s", name, tool.timeout)
+            return json.dumps({"error": f"{name} timed out"})
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Tool %s failed: %r", name, e)
+            return json.dumps({"error": f"{name} failed: {e}"})
+        finally:
+            if thread_future is not None and not thread_future.done():
+                self._release_when_done(thread_future)
+            else:
+                self.semaphore.release()
+
+        output = result if isinstance(result, str) else json.dumps(result)
+        if tool.cache_ttl:
+            self.cache.put(key, output, tool.cache_ttl)
+        return output
+
+    def _release_when_done(self, thread_future):
+        loop = asyncio.get_running_loop()
+        self.overrunning += 1
+
+        def release():
+            self.overrunning -= 1
+            self.semaphore.release()
+
+        thread_future.add_done_callback(lambda _: loop.call_soon_threadsafe(release))
+
+    def stats(self):
+        return {
+            "tools": sorted(self.tools),
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self.cache.entries),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "overrunning": self.overrunning,
+        }
@@ -0,0 +1,187 @@
+import time
+import asyncio
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Realtime API events that carry transcript text or mark where a user turn begins
+TRANSCRIPT_EVENT_TYPES = (
+    'input_audio_buffer.committed',
+    'conversation.item.input_audio_transcription.delta',
+    'conversation.item.input_audio_transcription.completed',
+    'conversation.item.input_audio_transcription.failed',
+    'response.audio_transcript.delta',
+    'response.audio_transcript.done',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    call_sid TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    at REAL NOT NULL,
+    complete INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_call_sid ON turns (call_sid, at);
+"""
+
+class TranscriptAssembler:
+    """Assemble one call's turns from Realtime API transcription events.
+
+    Deltas are appended to an in-memory list per item; a turn is handed to
+    on_turn(turn) only once its transcript completes, or as incomplete when
+    the call ends first (e.g. an interrupted reply). Turns are stamped with
+    the time their item was first seen, so the caller's words sort before
+    the reply even though their transcription finishes later.
+    """
+
+    def __init__(self, call_sid, on_turn):
+        self.call_sid = call_sid
+        self.on_turn = on_turn
+        self.items = {}  # item_id -> [role, first seen, delta strings]
+        self.turns = 0
+
+    def item(self, item_id, role):
+        entry = self.items.get(item_id)
+        if entry is None:
+            entry = self.items[item_id] = [role, time.time(), []]
+        return entry
+
+    def handle(self, event):
+        event_type = event['type']
+        item_id = event.get('item_id')
+        if item_id is None:
+            return
+        if event_type == 'input_audio_buffer.committed':
+            self.item(item_id, 'user')
+        elif event_type == 'conversation.item.input_audio_transcription.delta':
+            self.item(item_id, 'user')[2].append(event.get('delta', ''))
+        elif event_type == 'response.audio_transcript.delta':
+            self.item(item_id, 'assistant')[2].append(event.get('delta', ''))
+        elif event_type == 'conversation.item.input_audio_transcription.completed':
+            self.complete(item_id, 'user', event.get('transcript'))
+        elif event_type == 'response.audio_transcript.done':
+            self.complete(item_id, 'assistant', event.get('transcript'))
+        elif event_type == 'conversation.item.input_audio_transcription.failed':
+            self.items.pop(item_id, None)
+
+    def complete(self, item_id, role, transcript=None, complete=True):
+        role, at, parts = self.items.pop(item_id, None) or (role, time.time(), [])
+        text = ''.join(parts) if transcript is None else transcript
+        if text.strip():
+            self.turns += 1
+            self.on_turn((self.call_sid, item_id, role, text.strip(), at, complete))
+
+    def close(self):
+        """Hand over what was transcribed of items still in progress."""
+        for item_id, (role, _, _) in list(self.items.items()):
+            self.complete(item_id, role, complete=False)
+
+class TranscriptStore:
+    """Completed turns, written to SQLite (WAL mode) in batches off the event loop.
+
+    add() only appends to a list; a writer task flushes it every
+    flush_interval seconds, or sooner once batch_size turns are waiting, as
+    one transaction on a dedicated database thread.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='transcripts')
+        self.connection = None  # Only used on the executor's thread
+        self.pending = []
+        self.writing = []
+        self.wakeup = None
+        self.task = None
+        self.turns_written = 0
+        self.batches = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._disconnect)
+        self.executor.shutdown()
+
+    def add(self, turn):
+        """Queue a (call_sid, item_id, role, text, at, complete) turn for the next batch."""
+        self.start()
+        self.pending.append(turn)
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        self.writing, self.pending = self.pending, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._write, self.writing)
+            self.turns_written += len(self.writing)
+            self.batches += 1
+        except Exception:
+            # Keep the writer task alive whatever went wrong; the batch is lost but later ones may succeed
+            self.write_errors += 1
+            logger.exception("Failed to write %d transcript turns", len(self.writing))
+        finally:
+            self.writing = []
+
+    async def transcript(self, call_sid):
+        """Return a call's turns in order, including those not yet written."""
+        rows = await asyncio.get_running_loop().run_in_executor(self.executor, self._read, call_sid)
+        rows += [turn for turn in self.writing + self.pending if turn[0] == call_sid]
+        rows.sort(key=lambda turn: turn[4])
+        return [
+            {"item_id": item_id, "role": role, "text": text, "at": at, "complete": bool(complete)}
+            for _, item_id, role, text, at, complete in rows
+        ]
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _write(self, batch):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO turns (call_sid, item_id, role, text, at, complete) VALUES (?, ?, ?, ?, ?, ?)", batch
+            )
+
+    def _read(self, call_sid):
+        return self._connect().execute(
+            "SELECT call_sid, item_id, role, text, at, complete FROM turns WHERE call_sid = ? ORDER BY at", (call_sid,)
+        ).fetchall()
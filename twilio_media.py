@@ -0,0 +1,271 @@
+import time
+import base64
+import json
+import asyncio
+from collections import deque
+
+# Closes the JSON object opened by the prefixes from media_frame_template and mark_frame_template.
+MEDIA_FRAME_SUFFIX = '"}}'
+
+def media_frame_template(stream_sid):
+    """Return the serialized Twilio media frame prefix for a stream.
+
+    OpenAI audio deltas are already base64 (only A-Z, a-z, 0-9, '+', '/' and '='),
+    so they can be dropped between the prefix and MEDIA_FRAME_SUFFIX without
+    decoding, re-encoding or JSON escaping.
+    """
+    return (
+        '{"event":"media","streamSid":' + json.dumps(stream_sid)
+        + ',"media":{"payload":"'
+    )
+
+def media_frame(prefix, payload):
+    """Wrap a base64 payload into a complete Twilio media frame."""
+    return prefix + payload + MEDIA_FRAME_SUFFIX
+
+def mark_frame_template(stream_sid):
+    """Return the serialized Twilio mark frame prefix for a stream."""
+    return (
+        '{"event":"mark","streamSid":' + json.dumps(stream_sid)
+        + ',"mark":{"name":"'
+    )
+
+def mark_frame(prefix, name):
+    """Wrap a mark name (which must not need JSON escaping) into a complete Twilio mark frame."""
+    return prefix + name + MEDIA_FRAME_SUFFIX
+
+# Twilio serializes media frames compactly with "event" as the first key
+TWILIO_MEDIA_PREFIX = '{"event":"media"'
+
+# G.711 μ-law at 8 kHz: one byte per sample, 8 bytes per millisecond
+ULAW_BYTES_PER_MS = 8
+
+# Closes the JSON object opened by APPEND_PREFIX
+APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+APPEND_SUFFIX = '"}'
+
+class InboundAudioBatcher:
+    """Coalesce Twilio media frames into fewer input_audio_buffer.append events.
+
+    Decoded μ-law bytes accumulate in a per-call bytearray and are flushed
+    upstream once window_ms of audio is buffered, so added latency is bounded
+    by the window. Call flush() on stream stop or a speech boundary to push
+    out a partial window. A window of 0 forwards every frame as it arrives.
+    convert, if given, maps the μ-law bytes of each append to the session's
+    input format.
+    """
+
+    def __init__(self, send, window_ms=100, convert=None):
+        self.send = send
+        self.convert = convert
+        self.window_bytes = window_ms * ULAW_BYTES_PER_MS
+        self.buffer = bytearray()
+        self.frames_in = 0
+        self.appends_out = 0
+
+    async def add(self, payload):
+        """Buffer one base64 Twilio media payload, flushing if the window is full."""
+        self.frames_in += 1
+        if self.window_bytes <= 0:
+            if self.convert:
+                payload = base64.b64encode(self.convert(base64.b64decode(payload))).decode('ascii')
+            await self._send(payload)
+            return
+        self.buffer += base64.b64decode(payload)
+        if len(self.buffer) >= self.window_bytes:
+            await self.flush()
+
+    async def flush(self):
+        """Send any buffered audio upstream as a single append."""
+        if not self.buffer:
+            return
+        audio = self.convert(bytes(self.buffer)) if self.convert else self.buffer
+        payload = base64.b64encode(audio).decode('ascii')
+        self.buffer.clear()
+        await self._send(payload)
+
+    async def _send(self, payload):
+        self.appends_out += 1
+        await self.send(APPEND_PREFIX + payload + APPEND_SUFFIX)
+
+def base64_audio_ms(payload):
+    """Duration in milliseconds of a base64 μ-law payload, without decoding it."""
+    size = len(payload) * 3 // 4 - payload[-2:].count('=')
+    return size / ULAW_BYTES_PER_MS
+
+class PlaybackTracker:
+    """Track how much of the assistant's current audio item the caller has heard.
+
+    Every chunk sent to Twilio is followed by a mark; Twilio echoes a mark
+    back once the audio before it has played. On barge-in, interrupt()
+    returns the item and the playback position to pass to
+    conversation.item.truncate, interpolating real-time playback since the
+    last acknowledged mark and never going past the next unacknowledged one.
+    """
+
+    def __init__(self):
+        self.sequence = 0
+        self.pending = {}  # Mark name -> (item_id, item audio ms sent up to that mark)
+        self.item_id = None
+        self.sent_ms = 0
+        self.played_ms = 0
+        self.played_at = None
+
+    def sent(self, item_id, duration_ms):
+        """Record duration_ms of item_id sent to Twilio and return the mark name to send after it."""
+        if item_id != self.item_id:
+            self.item_id = item_id
+            self.sent_ms = 0
+            self.played_ms = 0
+            # Playback of a new item starts roughly when its first chunk is sent
+            self.played_at = time.monotonic()
+        self.sent_ms += duration_ms
+        self.sequence += 1
+        name = str(self.sequence)
+        self.pending[name] = (item_id, self.sent_ms)
+        return name
+
+    def acknowledged(self, name):
+        """Handle a mark echoed back by Twilio."""
+        entry = self.pending.pop(name, None)
+        if entry is None or entry[0] != self.item_id:
+            return
+        self.played_ms = entry[1]
+        self.played_at = time.monotonic()
+
+    def interrupt(self):
+        """Return (item_id, audio_end_ms) for audio still playing, or None, and stop tracking it."""
+        item_pending = [end for item_id, end in self.pending.values() if item_id == self.item_id]
+        truncation = None
+        if self.item_id is not None and item_pending:
+            elapsed_ms = (time.monotonic() - self.played_at) * 1000
+            audio_end_ms = min(self.played_ms + elapsed_ms, min(item_pending))
+            truncation = (self.item_id, int(audio_end_ms))
+        # Marks Twilio echoes back after a clear no longer mean the audio was heard
+        self.pending.clear()
+        self.item_id = None
+        return truncation
+
+# One Twilio media frame: 20 ms of 8 kHz μ-law
+FRAME_MS = 20
+FRAME_BYTES = FRAME_MS * ULAW_BYTES_PER_MS
+
+class OutboundPacer:
+    """Re-chunk outbound audio into 20 ms frames and send them at real time plus a lead.
+
+    OpenAI produces audio faster than real time; instead of pushing it all
+    into Twilio's buffer, run() keeps at most lead_ms of audio queued at
+    Twilio and holds the rest here, so flush() can drop it instantly on
+    barge-in. The schedule runs until what was sent has finished playing,
+    so short chunks arriving faster than real time are still paced. add() waits while max_buffer_ms is already queued, which
+    pushes back on the OpenAI socket. on_segment_sent(item_id, duration_ms)
+    is awaited after the last frame of each added chunk, e.g. to send a mark.
+    Queued audio is sliced through a memoryview, so a clip from a shared
+    memory map is framed without being copied.
+    """
+
+    def __init__(self, send_frame, on_segment_sent=None, lead_ms=100, max_buffer_ms=30000):
+        self.send_frame = send_frame
+        self.on_segment_sent = on_segment_sent
+        self.lead_ms = lead_ms
+        self.max_buffer_bytes = max_buffer_ms * ULAW_BYTES_PER_MS
+        self.segments = deque()  # [item_id, memoryview of audio, bytes sent, duration_ms] per added chunk
+        self.buffered_bytes = 0
+        self.data_ready = asyncio.Event()
+        self.space_ready = asyncio.Event()
+        self.space_ready.set()
+        self.playout_start = None
+        self.sent_ms = 0
+        self.last_item_id = None
+        self.drained_item_id = None
+        self.frame_played_at = None  # Monotonic time the frame being sent finishes playing at Twilio
+        self.frames_sent = 0
+        self.underruns = 0
+        self.flushed_ms = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+    @property
+    def buffered_ms(self):
+        return self.buffered_bytes / ULAW_BYTES_PER_MS
+
+    async def add(self, item_id, audio):
+        """Queue decoded μ-law audio for item_id, waiting while the buffer is full."""
+        if self.buffered_bytes >= self.max_buffer_bytes:
+            self.backpressure_waits += 1
+            started = time.monotonic()
+            while self.buffered_bytes >= self.max_buffer_bytes:
+                self.space_ready.clear()
+                await self.space_ready.wait()
+            self.backpressure_seconds += time.monotonic() - started
+        self.segments.append([item_id, memoryview(audio), 0, len(audio) / ULAW_BYTES_PER_MS])
+        self.buffered_bytes += len(audio)
+        self.data_ready.set()
+
+    def flush(self):
+        """Drop all queued audio immediately."""
+        self.flushed_ms += self.buffered_ms
+        self.segments.clear()
+        self.buffered_bytes = 0
+        self.playout_start = None
+        self.drained_item_id = None
+        self.data_ready.set()
+        self.space_ready.set()
+
+    async def run(self):
+        """Send queued frames on the real-time schedule until cancelled."""
+        while True:
+            now = time.monotonic()
+            if not self.segments:
+                self.data_ready.clear()
+                if self.playout_start is not None:
+                    playout_end = self.playout_start + self.sent_ms / 1000
+                    if now < playout_end:
+                        # Twilio is still playing what was sent; audio arriving now continues the schedule
+                        try:
+                            await asyncio.wait_for(self.data_ready.wait(), playout_end - now)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+                    # Playout caught up; more audio for the same item means Twilio ran dry mid-reply
+                    self.drained_item_id = self.last_item_id
+                    self.playout_start = None
+                await self.data_ready.wait()
+                continue
+
+            if self.playout_start is None:
+                if self.drained_item_id is not None and self.segments[0][0] == self.drained_item_id:
+                    self.underruns += 1
+                self.drained_item_id = None
+                self.playout_start = now
+                self.sent_ms = 0
+            ahead_ms = self.sent_ms - (now - self.playout_start) * 1000
+            # Send once a frame's room has opened below the lead, so a late wakeup doesn't send two at once
+            if ahead_ms > self.lead_ms - FRAME_MS:
+                await asyncio.sleep((ahead_ms - self.lead_ms + FRAME_MS) / 1000)
+                continue
+            if ahead_ms < 0:
+                # Audio was queued but sent late (e.g. a stalled loop), so Twilio ran dry; restart the schedule
+                self.underruns += 1
+                self.playout_start = now
+                self.sent_ms = 0
+
+            segment = self.segments[0]
+            item_id, audio, offset, duration_ms = segment
+            frame = audio[offset:offset + FRAME_BYTES]
+            segment[2] = offset + len(frame)
+            self.buffered_bytes -= len(frame)
+            if self.buffered_bytes < self.max_buffer_bytes:
+                self.space_ready.set()
+
+            self.last_item_id = item_id
+            self.frame_played_at = self.playout_start + (self.sent_ms + len(frame) / ULAW_BYTES_PER_MS) / 1000
+            await self.send_frame(base64.b64encode(frame).decode('ascii'))
+            self.frames_sent += 1
+            self.sent_ms += len(frame) / ULAW_BYTES_PER_MS
+
+            # A flush during the send may already have dropped this segment
+            if segment[2] == len(audio) and self.segments and self.segments[0] is segment:
+                self.segments.popleft()
+                if self.on_segment_sent:
+                    await self.on_segment_sent(item_id, duration_ms)
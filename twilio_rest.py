@@ -0,0 +1,59 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from metrics import TWILIO_REST_SECONDS, TWILIO_REST_ERRORS, TWILIO_REST_TIMEOUTS
+
+# Threads available for blocking Twilio REST requests
+TWILIO_REST_THREADS = int(os.getenv('TWILIO_REST_THREADS', 8))
+# Seconds before a Twilio REST request is abandoned
+TWILIO_REST_TIMEOUT = float(os.getenv('TWILIO_REST_TIMEOUT', 10))
+
+class TwilioRest:
+    """Run blocking Twilio REST requests on a dedicated thread pool.
+
+    The Twilio helper library is synchronous; calling it from a coroutine
+    freezes the event loop and every live call's audio with it. Each pool
+    thread keeps its own Client whose HTTP session reuses connections to
+    api.twilio.com, and every request is bounded by timeout both at the
+    socket and on the awaiting side.
+    """
+
+    def __init__(self, account_sid, auth_token, threads=TWILIO_REST_THREADS, timeout=TWILIO_REST_TIMEOUT):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='twilio-rest')
+        self.local = threading.local()
+
+    def client(self):
+        """Return the calling thread's Client, creating it on first use."""
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+            client = self.local.client = Client(self.account_sid, self.auth_token, http_client=http_client)
+        return client
+
+    def _invoke(self, request):
+        return request(self.client())
+
+    async def run(self, request):
+        """Await request(client) on the thread pool, e.g. run(lambda client: client.calls.create(...))."""
+        started = time.monotonic()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._invoke, request)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            TWILIO_REST_TIMEOUTS.inc()
+            raise
+        except Exception:
+            TWILIO_REST_ERRORS.inc()
+            raise
+        finally:
+            TWILIO_REST_SECONDS.observe(time.monotonic() - started)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)